@@ -0,0 +1,350 @@
+from ml import *
+from tblparser import *
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import tblparser
+
+# times table loading, descfunc/func formatting, the unique item / rune word loops and a full run,
+# optionally on tables scaled up by copying rows, and compares the results against a stored baseline
+
+# row class of every table, for resolving column positions when scaling
+ROWS = {
+    'string'            : StringTableData,
+    'expansionstring'   : StringTableData,
+    'patchstring'       : StringTableData,
+    'weapons'           : WeaponsTableData,
+    'armor'             : ArmorTableData,
+    'misc'              : MiscTableData,
+    'gems'              : GemsTableData,
+    'properties'        : PropertyTableData,
+    'itemstatcost'      : ItemsStatConstTableData,
+    'charstats'         : CharStatTableData,
+    'skills'            : SkillTableData,
+    'skilldesc'         : SkillDescTableData,
+    'uniqueitems'       : UniqueItemsTableData,
+    'runes'             : RuneWordsTableData,
+}
+
+# how copied rows stay valid: key columns get a `#n` suffix, id columns an offset.
+# copied uniques and rune words keep their properties (min/max may be skill ids), so their
+# renders mostly hit the property cache like repeated lines do in the real data
+SCALE = {
+    'string'            : {'suffix': ['key']},
+    'expansionstring'   : {'suffix': ['key']},
+    'patchstring'       : {'suffix': ['key']},
+    'weapons'           : {'suffix': ['name', 'code']},
+    'armor'             : {'suffix': ['name', 'code']},
+    'misc'              : {'suffix': ['name', 'code']},
+    'gems'              : {'suffix': ['code']},
+    'properties'        : {'suffix': ['code']},
+    'itemstatcost'      : {'suffix': ['stat']},
+    'skills'            : {'suffix': ['skill'], 'offset': ['id']},
+}
+
+STAGES = ['load', 'descfunc', 'func', 'render', 'main']
+
+def measure(fn, repeat: int, setup = None) -> float:
+    # best of `repeat` runs, `setup` runs untimed before each one
+    best = math.inf
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+def splitLines(data: bytes) -> list[bytes]:
+    lines = data.split(b'\n')
+    if lines and lines[-1] == b'':
+        lines.pop()
+
+    return [line.rstrip(b'\r') for line in lines]
+
+def scaleTable(name: str, src: str, dst: str, factor: int):
+    cls, filename = TableManager.TABLES[name]
+    rowcls = ROWS[name]
+    spec = SCALE.get(name, {})
+
+    with open(os.path.join(src, filename), 'rb') as f:
+        lines = splitLines(f.read())
+
+    headers = rowcls is not StringTableData
+    if headers and not lines:
+        shutil.copy(os.path.join(src, filename), os.path.join(dst, filename))
+        return
+
+    header, rows = (lines[0], lines[1:]) if headers else (None, lines)
+    encoding = 'cp1252' if headers else 'UTF8'
+    positions = dict(zip(
+        [column.attr for column in rowcls.SCHEMA.columns],
+        rowcls.SCHEMA.resolve(header.decode('UTF8').split('\t') if headers else []),
+    ))
+    width = max(i for indexes in positions.values() for i in indexes) + 1
+
+    table = []
+    for row in rows:
+        cols = row.split(b'\t')
+        cols.extend([b''] * (width - len(cols)))
+        table.append(cols)
+
+    offsets = {}
+    for attr in spec.get('offset', []):
+        i, = positions[attr]
+        offsets[attr] = 1 + max([toInt(cols[i].decode(), 0) for cols in table], default = 0)
+
+    out = [] if header is None else [header]
+    out.extend(rows)
+
+    for n in range(1, factor):
+        for cols in table:
+            if cols[0] == b'Expansion':
+                continue
+
+            cols = list(cols)
+
+            for attr in spec.get('suffix', []):
+                i, = positions[attr]
+                if cols[i]:
+                    cols[i] += f'#{n}'.encode(encoding)
+
+            for attr, offset in offsets.items():
+                i, = positions[attr]
+                if cols[i].strip().isdigit():
+                    cols[i] = str(int(cols[i]) + n * offset).encode()
+
+            out.append(b'\t'.join(cols))
+
+    with open(os.path.join(dst, filename), 'wb') as f:
+        f.write(b'\r\n'.join(out) + b'\r\n')
+
+def scaleTables(src: str, dst: str, factor: int):
+    # writes every table of `src` to `dst` with `factor` times the rows
+    os.makedirs(dst, exist_ok = True)
+    for name in TableManager.TABLES:
+        scaleTable(name, src, dst, factor)
+
+def allProps(tblmgr: TableManager) -> list[Property]:
+    props = [prop for item in tblmgr.uniqueitems.items for prop in item.props]
+    props += [prop for rw in tblmgr.runes.items for prop in rw.props]
+    props += [prop for gem in tblmgr.gems.data.values() for props in [gem.weaponProps, gem.helmProps, gem.shieldProps] for prop in props]
+    return props
+
+def benchLoad(results: dict, repeat: int):
+    # every run is a cold load: a table compiles its own extractor (and Property intern table)
+    # on construction and the cleanString cache is emptied before each run
+    tblmgr = TableManager(None)
+
+    for name, (cls, filename) in TableManager.TABLES.items():
+        table = cls(filename)
+        setattr(tblmgr, name, table)
+        results[f'load/{name}'] = {'seconds': measure(lambda: cls(filename), repeat, cleanString.cache_clear), 'count': len(TableDatabase.tableRows(table))}
+
+    for name, (cls, sources) in TableManager.INDEXES.items():
+        tables = [getattr(tblmgr, source) for source in sources]
+        results[f'index/{name}'] = {'seconds': measure(lambda: cls(*tables), repeat, cleanString.cache_clear), 'count': 1}
+
+def benchDescfunc(results: dict, repeat: int, tblmgr: TableManager):
+    # replays the exact format calls one render pass makes, grouped by descfunc,
+    # on the functions compiled for them
+    calls = {}
+    compile = ItemsStatConstTableData.compile
+
+    def capture(self, tblmgr):
+        format = compile(self, tblmgr)
+        group = calls.setdefault(self.descfunc, [])
+
+        def captured(*args, **kwargs):
+            group.append((format, args, kwargs))
+            return format(*args, **kwargs)
+
+        return captured
+
+    ItemsStatConstTableData.compile = capture
+    tblmgr.functions.clear()
+    try:
+        for prop in allProps(tblmgr):
+            tblmgr.getProperty(prop.prop).render(prop, tblmgr)
+    finally:
+        ItemsStatConstTableData.compile = compile
+        tblmgr.functions.clear()
+
+    for descfunc, group in sorted(calls.items(), key = lambda kv: (kv[0] is None, kv[0] or 0)):
+        def replay():
+            for format, args, kwargs in group:
+                format(*args, **kwargs)
+
+        results[f'descfunc/{descfunc}'] = {'seconds': measure(replay, repeat), 'count': len(group)}
+
+def benchFunc(results: dict, repeat: int, tblmgr: TableManager):
+    groups = {}
+    for prop in allProps(tblmgr):
+        propdata = tblmgr.getProperty(prop.prop)
+        key = '+'.join(str(f.func) for f in propdata.funcs)
+        groups.setdefault(key, []).append((propdata, prop))
+
+    for key, group in sorted(groups.items()):
+        def replay():
+            for propdata, prop in group:
+                propdata.format(prop, tblmgr)
+
+        results[f'func/{key}'] = {'seconds': measure(replay, repeat), 'count': len(group)}
+
+def benchRender(results: dict, repeat: int, parser: TableParser):
+    uniqueItems = parser.tblmgr.uniqueitems.items
+    runeWords = parser.tblmgr.runes.items
+
+    def uniques():
+        parser.propertyCache.clear()
+        for item in uniqueItems:
+            parser.formatUniqueItem(item)
+
+    def runes():
+        parser.propertyCache.clear()
+        for rw in runeWords:
+            parser.formatRuneWord(rw)
+
+    results['render/uniqueitems'] = {'seconds': measure(uniques, repeat), 'count': len(uniqueItems)}
+    results['render/runes'] = {'seconds': measure(runes, repeat), 'count': len(runeWords)}
+
+def benchMain(results: dict, repeat: int, workdir: str):
+    output = os.path.join(workdir, 'out')
+
+    def reset():
+        # nothing left from the previous run: no snapshot, no build cache, no cleaned strings
+        for filename in [SNAPSHOT_FILE, BUILD_FILE]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+        cleanString.cache_clear()
+
+    results['main/cold'] = {'seconds': measure(lambda: tblparser.run(['--output', output]), repeat, reset), 'count': 1}
+    results['main/warm'] = {'seconds': measure(lambda: tblparser.run(['--output', output]), repeat), 'count': 1}
+
+def runBenchmarks(stages: list[str], repeat: int, workdir: str) -> dict:
+    results = {}
+
+    if 'load' in stages:
+        benchLoad(results, repeat)
+
+    if {'descfunc', 'func', 'render'}.intersection(stages):
+        # indexes too, otherwise the first timed render pays for building them
+        parser = TableParser(None)
+        parser.tblmgr.preload([*TableManager.TABLES, *TableManager.INDEXES])
+
+        if 'descfunc' in stages:
+            benchDescfunc(results, repeat, parser.tblmgr)
+
+        if 'func' in stages:
+            benchFunc(results, repeat, parser.tblmgr)
+
+        if 'render' in stages:
+            benchRender(results, repeat, parser)
+
+    if 'main' in stages:
+        benchMain(results, repeat, workdir)
+
+    for result in results.values():
+        result['perItem'] = result['seconds'] / result['count'] if result['count'] else 0
+
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    # names of the benchmarks more than `threshold` slower than the baseline
+    regressions = []
+
+    print(f'{"benchmark":<28} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, result in results.items():
+        old = baseline.get(name)
+        if old is None or not old['seconds']:
+            print(f'{name:<28} {"-":>12} {result["seconds"] * 1e3:>10.3f}ms {"new":>8}')
+            continue
+
+        change = result['seconds'] / old['seconds'] - 1
+        flag = ''
+        if change > threshold:
+            regressions.append(name)
+            flag = ' !'
+
+        print(f'{name:<28} {old["seconds"] * 1e3:>10.3f}ms {result["seconds"] * 1e3:>10.3f}ms {change:>+8.1%}{flag}')
+
+    return regressions
+
+def parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description = 'benchmark table loading, rendering and generation')
+    ap.add_argument('-d', '--data', default = '.', help = 'directory with the .txt tables')
+    ap.add_argument('-s', '--scale', type = int, default = 1, help = 'copy every table row this many times (10, 100, ...)')
+    ap.add_argument('-r', '--repeat', type = int, default = 5, help = 'runs per benchmark, the best one counts')
+    ap.add_argument('--stages', default = ','.join(STAGES), help = f'comma separated subset of {",".join(STAGES)}')
+    ap.add_argument('-o', '--output', help = 'write the results as json to this file')
+    ap.add_argument('-b', '--baseline', help = 'compare against results written by an earlier --output')
+    ap.add_argument('--threshold', type = float, default = 0.1, help = 'slowdown that counts as a regression (0.1 = 10%%)')
+
+    args = ap.parse_args(argv)
+    args.stages = [stage for stage in args.stages.split(',') if stage]
+    for stage in args.stages:
+        if stage not in STAGES:
+            ap.error(f'unknown stage `{stage}`, choose from {",".join(STAGES)}')
+
+    return args
+
+def main(argv: list[str] | None = None) -> int:
+    args = parseArgs(argv)
+    stages = args.stages
+
+    data = os.path.abspath(args.data)
+    cwd = os.getcwd()
+
+    # always work on a copy, the full run writes a snapshot and its output next to the tables
+    with tempfile.TemporaryDirectory(prefix = 'tblbench') as workdir:
+        if args.scale > 1:
+            scaleTables(data, workdir, args.scale)
+        else:
+            for name, (cls, filename) in TableManager.TABLES.items():
+                shutil.copy(os.path.join(data, filename), workdir)
+
+        os.chdir(workdir)
+        try:
+            results = runBenchmarks(stages, args.repeat, workdir)
+        finally:
+            os.chdir(cwd)
+
+    report = {
+        'meta'      : {
+            'scale'     : args.scale,
+            'repeat'    : args.repeat,
+            'python'    : platform.python_version(),
+            'platform'  : platform.platform(),
+            'time'      : time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results'   : results,
+    }
+
+    if args.output:
+        with open(args.output, 'w', encoding = 'UTF8') as f:
+            json.dump(report, f, ensure_ascii = False, indent = 2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding = 'UTF8') as f:
+            baseline = json.load(f)['results']
+
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    # the exit status is what CI checks for regressions
+    Try(lambda: sys.exit(main()))
@@ -0,0 +1,130 @@
+from ml import *
+from tblparser import *
+import argparse
+import logging
+import numpy
+import os
+
+# the tables as numpy columns for bulk analytics: int columns as int64 and text columns as unicode
+# arrays, both masked where the cell is missing, plus a key -> row number index per table.
+# list columns and records (props, funcs, ...) stay on the row objects.
+# numpy is only needed by this module, tblparser itself runs without it
+
+# row key of the tables that keep their rows in a list, the first row with a key wins
+KEYS = {
+    'uniqueitems'   : 'index',
+    'runes'         : 'name',
+}
+
+def column(values: list, type: type) -> numpy.ma.MaskedArray:
+    mask = [v is None for v in values]
+
+    if type is int:
+        return numpy.ma.masked_array([0 if v is None else v for v in values], mask, dtype = numpy.int64)
+
+    return numpy.ma.masked_array(['' if v is None else v for v in values], mask, dtype = str)
+
+class ColumnTable:
+    # `columns` holds one array per plain schema column (and `index` for indexed tables), all in row order.
+    # `keys` are the table keys in row order: the dict keys for keyed tables (code, stat, skill id,
+    # string key), KEYS for uniqueitems / runes and the position for charstats / skilldesc
+
+    def __init__(self, name: str, tbl):
+        rows = TableDatabase.tableRows(tbl)
+
+        self.name       = name
+        self.rows       = rows
+        self.columns    = {}    # type: dict[str, numpy.ma.MaskedArray]
+        self.index      = {}    # type: dict[str | int, int]
+
+        data = getattr(tbl, 'data', None)
+        if isinstance(data, dict) and not hasattr(tbl, 'items'):
+            self.keys = list(data)
+        elif name in KEYS:
+            self.keys = [getattr(row, KEYS[name]) for row in rows]
+        else:
+            self.keys = list(range(len(rows)))
+
+        for i, key in enumerate(self.keys):
+            self.index.setdefault(key, i)
+
+        if not rows:
+            return
+
+        schema = type(rows[0]).SCHEMA
+        if schema.indexed:
+            self.columns['index'] = column([row.index for row in rows], int)
+
+        for c in schema.columns:
+            if type(c) is Column:
+                self.columns[c.attr] = column([getattr(row, c.attr) for row in rows], c.type)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, attr: str) -> numpy.ma.MaskedArray:
+        return self.columns[attr]
+
+    def row(self, key: str | int) -> int | None:
+        return self.index.get(key)
+
+    def get(self, key: str | int, attr: str):
+        i = self.index.get(key)
+        if i is None:
+            return None
+
+        value = self.columns[attr][i]
+        return None if value is numpy.ma.masked else value.item()
+
+    def select(self, mask: numpy.ndarray) -> list:
+        # the row objects where `mask` is set, masked entries count as not set
+        return [self.rows[i] for i in numpy.flatnonzero(numpy.ma.filled(mask, False))]
+
+    def save(self, path: str):
+        # every column as `<attr>` plus `<attr>.mask`, the keys as `_key`
+        arrays = {'_key': numpy.array([str(key) for key in self.keys])}
+        for attr, values in self.columns.items():
+            arrays[attr] = values.filled()
+            arrays[f'{attr}.mask'] = numpy.ma.getmaskarray(values)
+
+        numpy.savez_compressed(path, **arrays)
+
+    def describe(self) -> list[str]:
+        lines = [f'{self.name}: {len(self)} rows']
+        for attr, values in self.columns.items():
+            if values.dtype.kind == 'i' and values.count():
+                lines.append(f'  {attr:<16} {values.count():>7} set {values.min():>9} min {values.max():>9} max {values.mean():>12.2f} mean')
+
+        return lines
+
+def columnTables(tblmgr: TableManager, names: list[str] | None = None) -> dict[str, ColumnTable]:
+    return {name: ColumnTable(name, getattr(tblmgr, name)) for name in (TableManager.TABLES if names is None else names)}
+
+def parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description = 'export the tables as numpy columns')
+    ap.add_argument('-o', '--output', help = 'write every table to <output>/<table>.npz')
+    ap.add_argument('-t', '--table', action = 'append', choices = list(TableManager.TABLES), help = 'only this table (repeatable)')
+    ap.add_argument('--summary', action = 'store_true', help = 'print count, min, max and mean of every int column')
+
+    return ap.parse_args(argv)
+
+def main(argv: list[str] | None = None):
+    args = parseArgs(argv)
+    logging.basicConfig(format = '%(message)s', level = logging.INFO)
+
+    tblmgr = TableManager()
+    tables = columnTables(tblmgr, args.table)
+    tblmgr.saveSnapshot()
+
+    if args.output:
+        os.makedirs(args.output, exist_ok = True)
+        for name, table in tables.items():
+            table.save(os.path.join(args.output, f'{name}.npz'))
+            log('%s: %d rows, %d columns', name, len(table), len(table.columns))
+
+    if args.summary:
+        for table in tables.values():
+            print('\n'.join(table.describe()))
+
+if __name__ == '__main__':
+    Try(main)
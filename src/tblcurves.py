@@ -0,0 +1,161 @@
+from ml import *
+from tblparser import *
+import argparse
+import logging
+import numpy
+import os
+
+# the stat values items grant as numpy arrays, computed for every grant at once instead of one
+# execop()/minmax() call per property: per-level stats (op 2/4/5) evaluated at each character level
+# and min-max ranges converted to the units they are displayed in.
+# numpy is only needed by this tool, tblparser itself runs without it
+
+LEVELS  = numpy.arange(1, 100)
+OPS     = (2, 4, 5)
+
+def paramValue(tblmgr: TableManager, param) -> int | None:
+    # the number the formatters get as param, skill names resolved the way render() does
+    if isinstance(param, str):
+        return tblmgr.getSkill(param).id if param.startswith('sk') else None
+
+    return param
+
+def masked(values: list[int | None]) -> numpy.ma.MaskedArray:
+    return numpy.ma.masked_array(
+        [0 if v is None else v for v in values],
+        [v is None for v in values],
+        dtype = numpy.int64,
+    )
+
+def perLevelCurves(params: numpy.ndarray, opparams: numpy.ndarray, levels: numpy.ndarray = LEVELS) -> numpy.ndarray:
+    # (param * level) >> opparam, what a per-level stat adds at each level, one row per stat
+    return (params[:, None] * levels[None, :]) >> opparams[:, None]
+
+def perLevelRates(params: numpy.ndarray, opparams: numpy.ndarray) -> numpy.ndarray:
+    # param / 2^opparam, the increment per level descfunc 6-9 display (execop() for all stats at once)
+    return params / numpy.exp2(opparams)
+
+def displayRanges(descfuncs: numpy.ndarray, mins: numpy.ndarray, maxs: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    # min and max the way they are shown: descfunc 5 as value*100/128, everything else as is
+    scaled = descfuncs == 5
+    return numpy.ma.where(scaled, mins * 100 // 128, mins), numpy.ma.where(scaled, maxs * 100 // 128, maxs)
+
+class StatBatch:
+    # one entry per (grant, item stat) pair for the function blocks `accept(f, itemstat)` takes,
+    # in GrantIndex order. numeric columns are int64 arrays, masked where the value is missing
+
+    def __init__(self, tblmgr: TableManager, accept = None):
+        self.grants     = []    # type: list[Grant]
+        self.stats      = []    # type: list[ItemsStatConstTableData]
+        params          = []
+
+        for code, grants in tblmgr.grants.byProp.items():
+            propdata = tblmgr.properties.data.get(code)
+            if propdata is None:
+                continue
+
+            itemstats = []
+            for f in propdata.funcs:
+                itemstat = tblmgr.getItemStat(f.stat)
+                if itemstat is not None and (accept is None or accept(f, itemstat)):
+                    itemstats.append(itemstat)
+
+            for grant in grants:
+                param = paramValue(tblmgr, grant.prop.param)
+                for itemstat in itemstats:
+                    self.grants.append(grant)
+                    self.stats.append(itemstat)
+                    params.append(param)
+
+        self.params     = masked(params)
+        self.mins       = masked([grant.min for grant in self.grants])
+        self.maxs       = masked([grant.max for grant in self.grants])
+        self.opparams   = masked([itemstat.opparam for itemstat in self.stats])
+        self.descfuncs  = masked([itemstat.descfunc for itemstat in self.stats])
+
+    @classmethod
+    def perLevel(cls, tblmgr: TableManager) -> 'StatBatch':
+        # the stats scaled by character level, op 2/4/5 with an op param
+        return cls(tblmgr, lambda f, itemstat: itemstat.op in OPS and itemstat.opparam is not None)
+
+    def __len__(self) -> int:
+        return len(self.grants)
+
+    def curves(self, levels: numpy.ndarray = LEVELS) -> numpy.ma.MaskedArray:
+        values = perLevelCurves(self.params.filled(0), self.opparams.filled(0), levels)
+        mask = numpy.broadcast_to((self.params.mask | self.opparams.mask)[:, None], values.shape)
+        return numpy.ma.masked_array(values, mask)
+
+    def rates(self) -> numpy.ma.MaskedArray:
+        return numpy.ma.masked_array(perLevelRates(self.params.filled(0), self.opparams.filled(0)), self.params.mask | self.opparams.mask)
+
+    def ranges(self) -> tuple[numpy.ma.MaskedArray, numpy.ma.MaskedArray]:
+        return displayRanges(self.descfuncs.filled(0), self.mins, self.maxs)
+
+    def keys(self, tblmgr: TableManager) -> list[list]:
+        # the leading columns of every output row: where the grant is and which stat it is
+        return [
+            [grant.table, grant.row, grant.name, tblmgr.getString2(grant.name) or '', grant.slot or '', grant.prop.prop, grant.prop.param, itemstat.stat]
+            for grant, itemstat in zip(self.grants, self.stats)
+        ]
+
+KEY_HEADERS = ['table', 'row', 'name', 'localname', 'slot', 'prop', 'param', 'stat']
+
+def parseLevels(spec: str) -> numpy.ndarray:
+    # `1-99`, `1,10,20` or a mix of both
+    levels = []
+    for part in spec.split(','):
+        first, sep, last = part.partition('-')
+        levels.extend(range(int(first), int(last) + 1) if sep else [int(first)])
+
+    return numpy.array(levels)
+
+def tsvLines(headers: list[str], rows: list[list]) -> list[str]:
+    return ['\t'.join(headers)] + ['\t'.join('' if v is None else str(v) for v in row) for row in rows]
+
+def writeCurves(tblmgr: TableManager, path: str, levels: numpy.ndarray):
+    batch = StatBatch.perLevel(tblmgr)
+    rows = [
+        key + [rate] + curve
+        for key, rate, curve in zip(batch.keys(tblmgr), batch.rates().tolist(), batch.curves(levels).tolist())
+    ]
+
+    output = OutputFile(path, 'UTF8')
+    output.write(tsvLines(KEY_HEADERS + ['perlevel'] + [str(level) for level in levels], rows))
+    output.commit()
+
+    log('%d per-level stats -> %s', len(batch), path)
+
+def writeRanges(tblmgr: TableManager, path: str):
+    batch = StatBatch(tblmgr)
+    lo, hi = batch.ranges()
+    rows = [
+        key + [descfunc, min, max, displaymin, displaymax]
+        for key, descfunc, min, max, displaymin, displaymax in zip(
+            batch.keys(tblmgr), batch.descfuncs.tolist(), batch.mins.tolist(), batch.maxs.tolist(), lo.tolist(), hi.tolist())
+    ]
+
+    output = OutputFile(path, 'UTF8')
+    output.write(tsvLines(KEY_HEADERS + ['descfunc', 'min', 'max', 'displaymin', 'displaymax'], rows))
+    output.commit()
+
+    log('%d stat ranges -> %s', len(batch), path)
+
+def parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description = 'write per-level stat curves and displayed stat ranges of every granted property')
+    ap.add_argument('-o', '--output', default = '.', help = 'directory for statcurves.txt and statranges.txt')
+    ap.add_argument('--levels', default = '1-99', help = 'character levels to evaluate, e.g. 1-99 or 1,10,20,30')
+
+    return ap.parse_args(argv)
+
+def main(argv: list[str] | None = None):
+    args = parseArgs(argv)
+    logging.basicConfig(format = '%(message)s', level = logging.INFO)
+
+    tblmgr = TableManager()
+    writeCurves(tblmgr, os.path.join(args.output, 'statcurves.txt'), parseLevels(args.levels))
+    writeRanges(tblmgr, os.path.join(args.output, 'statranges.txt'))
+    tblmgr.saveSnapshot()
+
+if __name__ == '__main__':
+    Try(main)
@@ -1,15 +1,150 @@
 from ml import *
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import contextlib
+import functools
+import hashlib
+import heapq
+import html
+import io
+import json
+import logging
+import math
+import mmap
+import multiprocessing
+import os
+import pickle
 import re
+import sqlite3
+import time
 
 USELESS_CHARS = re.compile(r'ÿc[\d;:]|●|★|◆|\}', re.DOTALL)
+COLOR_CODES   = re.compile(r'ÿc([\d;:])')
+SYMBOL_CHARS  = re.compile(r'●|★|◆|\}')
+
+# in-game text colors, https://d2mods.info/forum/kb/viewarticle?a=54
+TEXT_COLORS = {
+    '0' : '#ffffff',    # white
+    '1' : '#ff4d4d',    # red
+    '2' : '#00ff00',    # set green
+    '3' : '#6969ff',    # magic blue
+    '4' : '#9f8f5f',    # unique gold
+    '5' : '#696969',    # dark gray
+    '6' : '#000000',    # black
+    '7' : '#d0c27d',    # tan
+    '8' : '#ffa800',    # orange
+    '9' : '#ffff64',    # yellow
+    ':' : '#008000',    # dark green
+    ';' : '#ae00ff',    # purple
+}
+
+# snapshots and build caches are also keyed on codeDigest(), so any change to this file drops them,
+# the versions only track their own file layout
+SNAPSHOT_FILE       = 'tblparser.snapshot'
+SNAPSHOT_VERSION    = 10
+
+BUILD_FILE          = 'tblparser.build'
+BUILD_VERSION       = 2
+
+SEARCH_FILE         = 'darkmoon.search'
+SEARCH_VERSION      = 1
+
+OUTPUT_DIR          = r'D:\Dev\Source\sources\Diablo II\DarkMoonData'
+
+logger = logging.getLogger('tblparser')
+
+def log(msg = '', *args):
+    # info level, %-style `args` are only formatted when the message is actually emitted
+    logger.info(msg, *args)
+
+class TableReader:
+    # memory-maps a tab separated table and slices rows straight out of the mapping,
+    # each row is only split up to the last wanted column, decoding is left to the Schema extractor
+
+    def __init__(self, filename: str, encoding: str = 'cp1252', *, headers: bool = True):
+        self.encoding   = encoding
+        self.headers    = []    # type: list[str]
+
+        with open(filename, 'rb') as f:
+            try:
+                self.buffer = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except ValueError:  # empty file can't be mapped
+                self.buffer = b''
+
+        self.pos = 0
+
+        if headers:
+            line = self.nextLine()
+            if line is not None:
+                self.headers = TableData.parse(line.decode('UTF8'))
+
+    def nextLine(self) -> bytes | None:
+        buffer = self.buffer
+        if self.pos >= len(buffer):
+            return None
+
+        end = buffer.find(b'\n', self.pos)
+        if end == -1:
+            end = len(buffer)
+
+        line = buffer[self.pos:end]
+        self.pos = end + 1
+
+        return line[:-1] if line.endswith(b'\r') else line
+
+    def rows(self, width: int):
+        # yields the raw columns of every non-empty row, at least `width` of them,
+        # anything past the last wanted column is left unsplit
+        padding = [b''] * width
+
+        try:
+            while (line := self.nextLine()) is not None:
+                if not line:
+                    continue
+
+                cols = line.split(b'\t', width)
+                if len(cols) < width:
+                    cols.extend(padding[len(cols):])
+
+                yield cols
+
+        finally:
+            self.close()
+
+    def close(self):
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+def fileDigest(filename: str) -> bytes:
+    with open(filename, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size = 16).digest()
+
+@functools.cache
+def codeDigest() -> bytes:
+    return fileDigest(__file__)
 
-def log(*args, **kwargs):
-    # print(*args, **kwargs)
-    pass
+@functools.lru_cache(maxsize = 1 << 16)
+def cleanString(s: str, colors: bool = False) -> str:
+    # drops color codes and decoration symbols in a single regex pass,
+    # with `colors` the `ÿc` codes become <font> spans instead
+    if not colors:
+        return USELESS_CHARS.sub('', s).strip()
 
-def loadTableFile(filename: str) -> list[bytes]:
-    return open(filename, 'rb').read().splitlines()
+    parts = COLOR_CODES.split(s)
+    spans = [(None, SYMBOL_CHARS.sub('', parts[0]))]
+
+    for i in range(1, len(parts), 2):
+        spans.append((TEXT_COLORS[parts[i]], SYMBOL_CHARS.sub('', parts[i + 1])))
+
+    spans = [span for span in spans if span[1].strip()]
+    if not spans:
+        return ''
+
+    spans[0] = (spans[0][0], spans[0][1].lstrip())
+    spans[-1] = (spans[-1][0], spans[-1][1].rstrip())
+
+    return ''.join(text if color is None else f'<font color={color}>{text}</font>' for color, text in spans)
 
 def printList(data: list[str], headers: list[str] = []):
     if not headers:
@@ -19,7 +154,7 @@ def printList(data: list[str], headers: list[str] = []):
         assert len(data) == len(headers)
 
     for i in range(len(data)):
-        log(f'[{i}] {headers[i]}: `{data[i]}`')
+        log('[%d] %s: `%s`', i, headers[i], data[i])
 
 def minmax(min, max, *, sign = False, parentheses = True) -> str:
     if max is None:
@@ -41,36 +176,271 @@ def minmax(min, max, *, sign = False, parentheses = True) -> str:
 def toInt(s: str, defval = None) -> int | None:
     return int(s) if s else defval
 
+class Column:
+    # a single attribute, found by header name; `index` is the historical position,
+    # used when the table has no headers or the header is missing
+
+    def __init__(self, attr: str, header: str | None, index: int, type: type = str, default = None):
+        self.attr       = attr
+        self.header     = header
+        self.index      = index
+        self.type       = type
+        self.default    = default
+
+    def headers(self) -> list[tuple[str | None, int]]:
+        return [(self.header, self.index)]
+
+    def source(self, indexes: list[int], namespace: dict) -> list[str]:
+        i, = indexes
+
+        if self.type is int:
+            return [f'self.{self.attr} = int(c[{i}]) if c[{i}] else {self.default!r}']
+
+        return [f'self.{self.attr} = c[{i}].decode(encoding)']
+
+class Columns(Column):
+    # several columns collected into a list, empty ones dropped unless told otherwise
+
+    def __init__(self, attr: str, headers: list[str], index: int, *, skipEmpty: bool = True):
+        super().__init__(attr, None, index)
+        self.names      = headers
+        self.skipEmpty  = skipEmpty
+
+    def headers(self) -> list[tuple[str | None, int]]:
+        return [(name, self.index + i) for i, name in enumerate(self.names)]
+
+    def source(self, indexes: list[int], namespace: dict) -> list[str]:
+        cols = ', '.join(f'c[{i}]' for i in indexes)
+
+        if self.skipEmpty:
+            return [f'self.{self.attr} = [v.decode(encoding) for v in ({cols},) if v]']
+
+        return [f'self.{self.attr} = [v.decode(encoding) for v in ({cols},)]']
+
+class Records(Column):
+    # `count` groups of columns, each non-empty group (tested on its `key` column) is passed to `factory`,
+    # header names are templates formatted with the 1-based group number.
+    # with `perLoad` the factory is made by calling `factory()` once per compiled extractor (one table load)
+
+    def __init__(self, attr: str, headers: list[str], count: int, index: int, factory, *, key: int = 0, enumerate: bool = False, perLoad: bool = False):
+        super().__init__(attr, None, index)
+        self.names      = headers
+        self.count      = count
+        self.factory    = factory
+        self.key        = key
+        self.enumerate  = enumerate
+        self.perLoad    = perLoad
+
+    def headers(self) -> list[tuple[str | None, int]]:
+        width = len(self.names)
+        return [
+            (name.format(n + 1), self.index + n * width + i)
+            for n in range(self.count)
+            for i, name in enumerate(self.names)
+        ]
+
+    def source(self, indexes: list[int], namespace: dict) -> list[str]:
+        factory = f'factory_{self.attr}'
+        namespace[factory] = self.factory() if self.perLoad else self.factory
+
+        width = len(self.names)
+        lines = [f'v = []']
+
+        for n in range(self.count):
+            group = indexes[n * width:(n + 1) * width]
+            args = ', '.join(f'c[{i}].decode(encoding)' for i in group)
+            if self.enumerate:
+                args = f'{n}, {args}'
+
+            lines.append(f'if c[{group[self.key]}]: v.append({factory}({args}))')
+
+        lines.append(f'self.{self.attr} = v')
+        return lines
+
+class Schema:
+    # declares the columns a record needs, `compile` resolves them against the headers
+    # of one file and generates a function building the record straight from the raw columns
+
+    def __init__(self, *columns: Column, indexed: bool = False):
+        self.columns = columns
+        self.indexed = indexed
+
+    def slots(self) -> tuple[str, ...]:
+        attrs = tuple(column.attr for column in self.columns)
+        return ('index',) + attrs if self.indexed else attrs
+
+    def resolve(self, headers: list[str]) -> list[list[int]]:
+        positions = {}
+        for i, name in enumerate(headers):
+            positions.setdefault(name.strip().lstrip('\ufeff').lower(), i)
+
+        resolved = []
+        for column in self.columns:
+            indexes = []
+            for name, index in column.headers():
+                if name is not None:
+                    pos = positions.get(name.lower())
+                    if pos is None:
+                        log('missing column `%s`, fallback to [%d]', name, index)
+                    else:
+                        index = pos
+
+                indexes.append(index)
+
+            resolved.append(indexes)
+
+        return resolved
+
+    def compile(self, cls: type, reader: TableReader):
+        resolved = self.resolve(reader.headers)
+
+        namespace = {
+            'cls'       : cls,
+            'new'       : object.__new__,
+            'encoding'  : reader.encoding,
+        }
+
+        lines = [
+            'def extract(c, index = None):',
+            '    self = new(cls)',
+        ]
+
+        if self.indexed:
+            lines.append('    self.index = index')
+
+        for column, indexes in zip(self.columns, resolved):
+            lines.extend(f'    {l}' for l in column.source(indexes, namespace))
+
+        lines.append('    return self')
+
+        exec('\n'.join(lines), namespace)
+
+        extract = namespace['extract']
+        extract.width = max(i for indexes in resolved for i in indexes) + 1
+        return extract
+
 class TableData:
+    __slots__ = ()
+
+    SCHEMA = None   # type: Schema
+
     @staticmethod
     def parse(line: str) -> list[str]:
         return line.split('\t')
 
+    @classmethod
+    def extractor(cls, reader: TableReader):
+        return cls.SCHEMA.compile(cls, reader)
+
     def __repr__(self) -> str:
         return self.__str__()
 
+class Property(TableData):
+    # immutable and hashable, so rendered results can be cached and shared freely
+
+    __slots__ = ('prop', 'param', 'min', 'max')
+
+    def __init__(self, prop: str, param: str, min: str, max: str) -> None:
+        setattr = object.__setattr__
+        setattr(self, 'prop',   prop)
+        setattr(self, 'param',  toInt(param, 0) if not param or param.isdigit() else param)
+        setattr(self, 'min',    toInt(min, 0))
+        setattr(self, 'max',    toInt(max, 0))
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f'Property is immutable, can\'t set `{name}`')
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f'Property is immutable, can\'t delete `{name}`')
+
+    def __getstate__(self) -> tuple:
+        return self.key()
+
+    def __setstate__(self, state: tuple):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    def key(self) -> tuple:
+        return (self.prop, self.param, self.min, self.max)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Property):
+            return NotImplemented
+
+        return self.key() == other.key()
+
+    def __hash__(self) -> int:
+        return hash(self.key())
+
+    def __str__(self) -> str:
+        return '\n'.join([
+            f'prop  = {self.prop}',
+            f'param = {self.param}',
+            f'min   = {self.min}',
+            f'max   = {self.max}',
+        ])
+
+    @classmethod
+    def interner(cls):
+        # the same property line shows up on many rows (every gem repeats it for weapon/helm/shield),
+        # the returned make() shares a single object per distinct line. one per table load, so nothing
+        # outlives it: the schemas pass it to Records with `perLoad`
+        interned = {}   # type: dict[tuple[str, str, str, str], Property]
+
+        def make(prop: str, param: str, min: str, max: str) -> 'Property':
+            key = (prop, param, min, max)
+
+            try:
+                return interned[key]
+            except KeyError:
+                pass
+
+            value = interned[key] = cls(prop, param, min, max)
+            return value
+
+        return make
+
+class RenderedProperty(TableData):
+    # what rendering a Property produced: the text lines and the priority they sort by,
+    # `deps` holds the table rows it read when rendered under TableManager.recording()
+
+    __slots__ = ('prop', 'lines', 'descpriority', 'deps')
+
+    def __init__(self, prop: Property, lines: list[str], descpriority: int):
+        self.prop           = prop
+        self.lines          = tuple(lines)
+        self.descpriority   = descpriority
+        self.deps           = None  # type: frozenset[tuple[str, object]] | None
+
+    def __str__(self) -> str:
+        return '\n'.join([
+            f'prop          = {self.prop.key()}',
+            f'lines         = {self.lines}',
+            f'descpriority  = {self.descpriority}',
+        ])
+
 class StringTableData(TableData):
-    def __init__(self, line: str):
-        self.key, self.value = self.parse(line)
+    SCHEMA = Schema(
+        Column('key',           None,           0),
+        Column('value',         None,           1),
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return f'{self.key}: {self.value}'
 
 class StringTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename, 'UTF8', headers = False)
 
         self.data       = OrderedDict()     # type: dict[str, StringTableData]
         self.dataList   = []                # type: list[StringTableData]
         self.keyIndex   = {}                # type: dict[str | int, str | int]
 
-        for l in lines:
-            if not l:
-                continue
-
-            l = l.decode('UTF8')
+        extract = StringTableData.extractor(reader)
 
-            data = StringTableData(l)
+        for cols in reader.rows(extract.width):
+            data = extract(cols)
             self.dataList.append(data)
 
             if data.key == 'x':
@@ -104,10 +474,7 @@ class StringTable:
         return self
 
     def strip(self, s: str) -> str:
-        for p in USELESS_CHARS.findall(s):
-            s = s.replace(p, '')
-
-        return s.strip()
+        return cleanString(s)
 
     def get(self, key: str) -> str:
         return self.strip(self.data[key].value)
@@ -176,18 +543,42 @@ class StringTable:
             'AssOnly',
         ][classId])
 
-class WeaponsTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
+class StringIndex:
+    # all three string tables merged with patchstring > expansionstring > string precedence,
+    # values are stored already stripped so a lookup is a single dict access
 
-        self.index          = index
-        self.name           = items[0]
-        self.type           = items[1]
-        self.code           = items[3]
-        self.namestr        = items[5]
-        self.reqstr         = toInt(items[23])
-        self.reqdex         = toInt(items[24])
-        self.durability     = toInt(items[25])
+    def __init__(self, string: StringTable, expansionstring: StringTable, patchstring: StringTable):
+        self.data       = {}    # type: dict[str, str]
+        self.byIndex    = {}    # type: dict[int, str]
+        self.colored    = {}    # type: dict[str, str]
+
+        for tbl in [string, expansionstring, patchstring]:
+            for key, item in tbl.data.items():
+                self.data[key] = tbl.strip(item.value)
+
+                # only the few strings with color codes differ, the rest falls back to `data`
+                if 'ÿc' in item.value:
+                    self.colored[key] = cleanString(item.value, colors = True)
+                else:
+                    self.colored.pop(key, None)
+
+        # getStringByIndex numbering: string 0+, patchstring 10000+, expansionstring 20000+
+        for base, tbl in [(0, string), (10000, patchstring), (20000, expansionstring)]:
+            for i, item in enumerate(tbl.dataList[:10000]):
+                self.byIndex[base + i] = tbl.strip(item.value)
+
+class WeaponsTableData(TableData):
+    SCHEMA = Schema(
+        Column('name',          'name',         0),
+        Column('type',          'type',         1),
+        Column('code',          'code',         3),
+        Column('namestr',       'namestr',      5),
+        Column('reqstr',        'reqstr',       23, int),
+        Column('reqdex',        'reqdex',       24, int),
+        Column('durability',    'durability',   25, int),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -203,21 +594,19 @@ class WeaponsTableData(TableData):
 
 class WeaponsTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = {}  # type: dict[str, WeaponsTableData]
 
         index = 1
 
-        for l in lines[1:]:
-            if not l:
-                continue
+        extract = WeaponsTableData.extractor(reader)
 
-            l = l.decode('cp1252')
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
 
-            data = WeaponsTableData(index, l)
+            data = extract(cols, index)
             if data.name == 'Expansion':
                 continue
 
@@ -252,17 +641,17 @@ class WeaponsTable:
         }.get(item.type)
 
 class ArmorTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index          = index
-        self.name           = items[0]
-        self.reqstr         = toInt(items[9])
-        self.reqdex         = toInt(items[10])
-        self.durability     = toInt(items[12])
-        self.levelreq       = items[15]
-        self.code           = items[18]
-        self.namestr        = items[19]
+    SCHEMA = Schema(
+        Column('name',          'name',         0),
+        Column('reqstr',        'reqstr',       9, int),
+        Column('reqdex',        'reqdex',       10, int),
+        Column('durability',    'durability',   12, int),
+        Column('levelreq',      'levelreq',     15, int),
+        Column('code',          'code',         18),
+        Column('namestr',       'namestr',      19),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -278,21 +667,19 @@ class ArmorTableData(TableData):
 
 class ArmorTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = {}  # type: dict[str, ArmorTableData]
 
         index = 1001
 
-        for l in lines[1:]:
-            if not l:
-                continue
+        extract = ArmorTableData.extractor(reader)
 
-            l = l.decode('cp1252')
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
 
-            data = ArmorTableData(index, l)
+            data = extract(cols, index)
             if data.name == 'Expansion':
                 continue
 
@@ -310,14 +697,14 @@ class ArmorTable:
         return self.data.get(code)
 
 class MiscTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index          = index
-        self.name           = items[0]
-        self.levelreq       = items[6]
-        self.code           = items[13]
-        self.namestr        = items[15]
+    SCHEMA = Schema(
+        Column('name',          'name',         0),
+        Column('levelreq',      'levelreq',     6, int),
+        Column('code',          'code',         13),
+        Column('namestr',       'namestr',      15),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -330,21 +717,19 @@ class MiscTableData(TableData):
 
 class MiscTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = {}  # type: dict[str, MiscTableData]
 
         index = 2001
 
-        for l in lines[1:]:
-            if not l:
-                continue
+        extract = MiscTableData.extractor(reader)
 
-            l = l.decode('cp1252')
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
 
-            data = MiscTableData(index, l)
+            data = extract(cols, index)
             if data.name == 'Expansion':
                 continue
 
@@ -359,16 +744,17 @@ class MiscTable:
         return self.data.get(code)
 
 class GemsTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index          = index
-        self.name           = items[0]
-        self.code           = items[3]
-        self.levelreq       = 0
-        self.weaponProps    = [Property(*p) for p in zip(*[iter(items[5:17])]*4) if p[0]]
-        self.helmProps      = [Property(*p) for p in zip(*[iter(items[17:29])]*4) if p[0]]
-        self.shieldProps    = [Property(*p) for p in zip(*[iter(items[29:41])]*4) if p[0]]
+    SCHEMA = Schema(
+        Column('name',          'name',         0),
+        Column('code',          'code',         3),
+        Records('weaponProps',  ['weaponMod{}Code', 'weaponMod{}Param', 'weaponMod{}Min', 'weaponMod{}Max'], 3, 5, Property.interner, perLoad = True),
+        Records('helmProps',    ['helmMod{}Code', 'helmMod{}Param', 'helmMod{}Min', 'helmMod{}Max'], 3, 17, Property.interner, perLoad = True),
+        Records('shieldProps',  ['shieldMod{}Code', 'shieldMod{}Param', 'shieldMod{}Min', 'shieldMod{}Max'], 3, 29, Property.interner, perLoad = True),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
+
+    levelreq = 0
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -383,22 +769,20 @@ class GemsTableData(TableData):
 
 class GemsTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = {}  # type: dict[str, GemsTableData]
 
         index = 1
 
-        for l in lines[1:]:
-            if not l:
-                continue
+        extract = GemsTableData.extractor(reader)
 
-            l = l.decode('cp1252')
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
             # raise
 
-            data = GemsTableData(index, l)
+            data = extract(cols, index)
             if data.name == 'Expansion':
                 continue
 
@@ -413,14 +797,14 @@ class GemsTable:
         return self.data[code]
 
 class SkillTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index          = index
-        self.skill          = items[0]
-        self.id             = toInt(items[1], 0)
-        self.charclass      = toInt(items[2], 0)
-        self.skilldesc      = toInt(items[3], 0)
+    SCHEMA = Schema(
+        Column('skill',         'skill',        0),
+        Column('id',            'id',           1, int, 0),
+        Column('charclass',     'charclass',    2, int, 0),
+        Column('skilldesc',     'skilldesc',    3, int, 0),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -433,21 +817,18 @@ class SkillTableData(TableData):
 
 class SkillTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers    = TableData.parse(lines[0].decode('UTF8'))
+        self.headers    = reader.headers
         self.data       = {}    # type: dict[int, SkillTableData]
         self.dataByName = {}    # type: dict[str, SkillTableData]
 
         index = 0
 
-        for l in lines[1:]:
-            if not l:
-                continue
-
-            l = l.decode('cp1252')
+        extract = SkillTableData.extractor(reader)
 
-            data = SkillTableData(index, l)
+        for cols in reader.rows(extract.width):
+            data = extract(cols, index)
             index += 1
 
             if data.id in self.data:
@@ -466,16 +847,16 @@ class SkillTable:
         return self.dataByName[name]
 
 class SkillDescTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index      = index
-        self.skilldesc  = items[0]
-        self.strname    = toInt(items[7])
-        self.strshort   = toInt(items[8])
-        self.strlong    = toInt(items[9])
-        self.stralt     = toInt(items[10])
-        self.strmana    = toInt(items[11])
+    SCHEMA = Schema(
+        Column('skilldesc',     'skilldesc',    0),
+        Column('strname',       'str name',     7, int),
+        Column('strshort',      'str short',    8, int),
+        Column('strlong',       'str long',     9, int),
+        Column('stralt',        'str alt',      10, int),
+        Column('strmana',       'str mana',     11, int),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -490,38 +871,31 @@ class SkillDescTableData(TableData):
 
 class SkillDescTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = []  # type: list[SkillDescTableData]
 
         index = 0
 
-        for index, l in enumerate(lines[1:]):
-            if not l:
-                continue
-
-            l = l.decode('cp1252')
+        extract = SkillDescTableData.extractor(reader)
 
-            data = SkillDescTableData(index, l)
+        for index, cols in enumerate(reader.rows(extract.width)):
+            data = extract(cols, index)
             self.data.append(data)
 
     def get(self, code: str) -> SkillDescTableData:
         return self.data[code]
 
 class CharStatTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index      = index
-        self.charclass  = items[0]      # `Amazon`
-        self.allSkills  = items[43]     # `ModStr3a`
-        self.skillTabs  = [
-            items[44],     # `StrSklTabItem3`
-            items[45],     # `StrSklTabItem2`
-            items[46],     # `StrSklTabItem1`
-        ]
-        self.classOnly  = items[47]     # `AmaOnly`
+    SCHEMA = Schema(
+        Column('charclass',     'class',        0),     # `Amazon`
+        Column('allSkills',     'StrAllSkills', 43),    # `ModStr3a`
+        Columns('skillTabs',    ['StrSkillTab1', 'StrSkillTab2', 'StrSkillTab3'], 44, skipEmpty = False),   # `StrSklTabItem3` ...
+        Column('classOnly',     'StrClassOnly', 47),    # `AmaOnly`
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -534,21 +908,19 @@ class CharStatTableData(TableData):
 
 class CharStatTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = []  # type: list[CharStatTableData]
 
         index = 0
-        for l in lines[1:]:
-            if not l:
-                continue
+        extract = CharStatTableData.extractor(reader)
 
-            l = l.decode('cp1252')
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
             # raise
 
-            data = CharStatTableData(index, l)
+            data = extract(cols, index)
             if data.charclass == 'Expansion':
                 continue
 
@@ -560,6 +932,8 @@ class CharStatTable:
 
 class PropertyTableData(TableData):
     class Function(TableData):
+        __slots__ = ('index', 'set', 'val', 'func', 'stat')
+
         def __init__(self, index: int, set: str, val: str, func: str, stat: str):
             self.index  = index
             self.set    = toInt(set)
@@ -576,138 +950,175 @@ class PropertyTableData(TableData):
                 f'stat  = {self.stat}',
             ])
 
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index  = index
-        self.code   = items[0]
-        self.funcs  = [PropertyTableData.Function(index, *p) for index, p in enumerate(zip(*[iter(items[2:30])]*4)) if p[2]]
+    SCHEMA = Schema(
+        Column('code',          'code',         0),
+        Records('funcs',        ['set{}', 'val{}', 'func{}', 'stat{}'], 7, 2, Function, key = 2, enumerate = True),
 
         # comments
-        self.desc   = items[30]
-        self.param  = items[31]
-        self.min    = items[32]
-        self.max    = items[33]
-        self.notes  = items[34]
+        Column('desc',          '*desc',        30),
+        Column('param',         '*param',       31),
+        Column('min',           '*min',         32),
+        Column('max',           '*max',         33),
+        Column('notes',         '*notes',       34),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
+
+    # funcs that set the line priority themselves, whatever their item stat says
+    FUNC_PRIORITY = {
+        7   : 2000,
+        10  : 2999,
+        14  : 1,
+        20  : 0,
+        21  : 3000,
+        23  : 0,
+    }
 
     def format(self, prop: 'Property', tblmgr: 'TableManager') -> list[str]:
+        return list(self.render(prop, tblmgr).lines)
+
+    def render(self, prop: 'Property', tblmgr: 'TableManager') -> 'RenderedProperty':
+        return tblmgr.compiled(self)(prop)
+
+    def compile(self, tblmgr: 'TableManager'):
+        # item stats, their formatters and the priority of every function block are resolved once,
+        # the returned render(prop) only runs the blocks on the values of `prop`.
+        # `prop` is never modified, the resolved skill id only lives in the result
         if not self.funcs:
             raise NotImplementedError(f'{self}')
 
-        if isinstance(prop.param, str):
-            if prop.param.startswith('sk'):
-                prop.param = tblmgr.getSkill(prop.param).id
-            else:
-                raise NotImplementedError(f'{prop}')
-
-        lines = []
+        steps = []
+        descpriority = 0
 
         for f in self.funcs:
-            itemstat = tblmgr.itemstatcost.get(f.stat)
+            itemstat = tblmgr.getItemStat(f.stat)
 
             if itemstat is not None and itemstat.descpriority:
-                prop.descpriority = max(prop.descpriority, itemstat.descpriority)
+                descpriority = max(descpriority, itemstat.descpriority)
             else:
-                prop.descpriority = 1000
-
-            log('---------------------')
-            log(prop)
-            log()
-            log(itemstat)
-            log()
-            log(f)
-            log()
-
-            match f.func:
-                # https://d2mods.info/forum/kb/viewarticle?a=345
-
-                case 1: # Applies a value to a stat, can use SetX parameter
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max))
-
-                case 2: # defensive function only, similar to 1 ???
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max))
-
-                case 3: # Apply the same min-max range as used in the previous function block (see res-all)
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max))
-
-                case 5: # Dmg-min related
-                    lines.append(f'+{minmax(prop.min, prop.max)} {tblmgr.getString("ModStr1g")}')
+                descpriority = 1000
 
-                case 6: # Dmg-max related
-                    lines.append(f'+{minmax(prop.min, prop.max)} {tblmgr.getString("ModStr1f")}')
+            descpriority = self.FUNC_PRIORITY.get(f.func, descpriority)
+            steps.append((f, itemstat, self.compileFunction(tblmgr, f, itemstat)))
 
-                case 7: # Dmg%
-                    prop.descpriority = 2000
-                    lines.append(f'+{minmax(prop.min, prop.max)}% {tblmgr.getString("strModEnhancedDamage")}')
-
-                case 8: # use for speed properties (ias, fcr, etc ...)
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max))
-
-                case 10: # skilltab skill group
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, prop.param))
-                    prop.descpriority = 2999
-
-                case 11: # event-based skills
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, prop.param))
-
-                case 12: # random selection of parameters for parameter-based stat
+        def render(prop: 'Property') -> 'RenderedProperty':
+            param = prop.param
+            if isinstance(param, str):
+                if param.startswith('sk'):
+                    param = tblmgr.getSkill(param).id
+                else:
+                    raise NotImplementedError(f'{prop}')
+
+            lines = []
+            trace = logger.isEnabledFor(logging.DEBUG)
+
+            for f, itemstat, step in steps:
+                if trace:
+                    logger.debug('---------------------\n%s\n\n%s\n\n%s\n', prop, itemstat, f)
+
+                step(lines, prop, param)
+
+                if lines[-1] is None:
+                    lines.pop()
+
+            return RenderedProperty(prop, lines, descpriority)
+
+        return render
+
+    def compileFunction(self, tblmgr: 'TableManager', f: 'PropertyTableData.Function', itemstat: 'ItemsStatConstTableData | None'):
+        # one function block as step(lines, prop, param), which appends the line(s) it renders
+        match f.func:
+            # https://d2mods.info/forum/kb/viewarticle?a=345
+
+            case 1 | 2 | 3 | 8 | 15 | 16:
+                # 1: Applies a value to a stat, can use SetX parameter
+                # 2: defensive function only, similar to 1 ???
+                # 3: Apply the same min-max range as used in the previous function block (see res-all)
+                # 8: use for speed properties (ias, fcr, etc ...)
+                # 15: use min field only
+                # 16: use max field only
+                format = tblmgr.compiled(itemstat)
+
+                def step(lines: list, prop: 'Property', param):
+                    lines.append(format(prop.min, prop.max))
+
+            case 5 | 6 | 7:
+                # 5: Dmg-min related
+                # 6: Dmg-max related
+                # 7: Dmg%
+                unit, desc = {
+                    5: ('', tblmgr.getString('ModStr1g')),
+                    6: ('', tblmgr.getString('ModStr1f')),
+                    7: ('%', tblmgr.getString('strModEnhancedDamage')),
+                }[f.func]
+
+                def step(lines: list, prop: 'Property', param):
+                    lines.append(f'+{minmax(prop.min, prop.max)}{unit} {desc}')
+
+            case 10 | 11 | 18 | 19 | 22 | 24:
+                # 10: skilltab skill group
+                # 11: event-based skills
+                # 18: Related to /time properties
+                # 19: Related to charged item
+                # 22: Individual skill, using param for skill ID, random between min-max
+                # 24: property applied to character or target monster
+                format = tblmgr.compiled(itemstat)
+
+                def step(lines: list, prop: 'Property', param):
+                    lines.append(format(prop.min, prop.max, param))
+
+            case 12: # random selection of parameters for parameter-based stat
+                assert itemstat.descfunc == 27
+                format = tblmgr.compiled(itemstat)
+
+                def step(lines: list, prop: 'Property', param):
                     lines.append('随机技能:')
                     for skillId in range(prop.min, prop.max + 1, 1):
-                        assert itemstat.descfunc == 27
-                        lines.append('    ' + itemstat.format(tblmgr, 0, prop.param, skillId))
+                        lines.append('    ' + format(0, param, skillId))
 
-                case 14: # inventory positions on item ??? (related to socket)
+            case 14: # inventory positions on item ??? (related to socket)
+                desc = tblmgr.getString(itemstat.descstr2)
+
+                def step(lines: list, prop: 'Property', param):
                     if prop.min is not None or prop.max is not None:
-                        lines.append(f'{tblmgr.getString(itemstat.descstr2)} ({minmax(prop.min, prop.max, parentheses = False)})')
+                        lines.append(f'{desc} ({minmax(prop.min, prop.max, parentheses = False)})')
                     else:
-                        lines.append(f'{tblmgr.getString(itemstat.descstr2)} ({prop.param})')
-                    prop.descpriority = 1
-
-                case 15: # use min field only
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max))
+                        lines.append(f'{desc} ({param})')
 
-                case 16: # use max field only
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max))
+            case 17: # use param field only
+                format = tblmgr.compiled(itemstat)
 
-                case 17: # use param field only
-                    lines.append(itemstat.format(tblmgr, param = prop.param))
+                def step(lines: list, prop: 'Property', param):
+                    lines.append(format(param = param))
 
-                case 18: # Related to /time properties
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, prop.param))
+            case 20: # Simple boolean stuff. Use by indestruct
+                desc = tblmgr.getString('ModStre9s')
 
-                case 19: # Related to charged item
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, prop.param))
-
-                case 20: # Simple boolean stuff. Use by indestruct
+                def step(lines: list, prop: 'Property', param):
                     assert prop.min == 1
-                    lines.append(tblmgr.getString('ModStre9s'))
-                    prop.descpriority = 0
-
-                case 21: # Add to group of skills, group determined by stat ID, uses ValX parameter
-                    # if itemstat.descfunc is None:
-                    #     offset = 0 if f.val is None else f.val
-                    #     lines.append(f'+{minmax(prop.min, prop.max)} {strtbl.getOffset(itemstat.descstrpos, offset)}')
-                    # else:
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, funcval = f.val))
-                    prop.descpriority = 3000
+                    lines.append(desc)
 
-                case 22: # Individual skill, using param for skill ID, random between min-max
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, prop.param))
+            case 21: # Add to group of skills, group determined by stat ID, uses ValX parameter
+                # if itemstat.descfunc is None:
+                #     offset = 0 if f.val is None else f.val
+                #     lines.append(f'+{minmax(prop.min, prop.max)} {strtbl.getOffset(itemstat.descstrpos, offset)}')
+                # else:
+                format = tblmgr.compiled(itemstat)
+                funcval = f.val
 
-                case 23: # ethereal
-                    lines.append(tblmgr.getStringByIndex(22745))
-                    prop.descpriority = 0
+                def step(lines: list, prop: 'Property', param):
+                    lines.append(format(prop.min, prop.max, funcval = funcval))
 
-                case 24: # property applied to character or target monster
-                    lines.append(itemstat.format(tblmgr, prop.min, prop.max, prop.param))
+            case 23: # ethereal
+                desc = tblmgr.getStringByIndex(22745)
 
-                case _:
-                    raise NotImplementedError(f'func: {f}')
+                def step(lines: list, prop: 'Property', param):
+                    lines.append(desc)
 
-            if lines[-1] is None:
-                lines.pop()
+            case _:
+                raise NotImplementedError(f'func: {f}')
 
-        return lines
+        return step
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -723,20 +1134,17 @@ class PropertyTableData(TableData):
 
 class PropertyTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = {}  # type: dict[str, PropertyTableData]
 
         index = 0
 
-        for l in lines[1:]:
-            if not l:
-                continue
-
-            l = l.decode('cp1252')
+        extract = PropertyTableData.extractor(reader)
 
-            data = PropertyTableData(index, l)
+        for cols in reader.rows(extract.width):
+            data = extract(cols, index)
             if data.code == 'Expansion':
                 continue
 
@@ -751,207 +1159,254 @@ class PropertyTable:
         return self.data[code]
 
 class ItemsStatConstTableData(TableData):
-    def __init__(self, index: int, line: str):
-        items = self.parse(line)
-
-        self.index          = index
-        self.stat           = items[0]
-        self.op             = toInt(items[25])
-        self.opparam        = toInt(items[26])
-        self.opbase         = items[27]
-        self.opstat1        = items[28]
-        self.opstat2        = items[29]
-        self.opstat3        = items[30]
-        self.direct         = toInt(items[31])
-        self.maxstat        = items[32]
-        self.descpriority   = toInt(items[39], 0)
-        self.descfunc       = toInt(items[40])
-        self.descval        = toInt(items[41])
-        self.descstrpos     = items[42]
-        self.descstrneg     = items[43]
-        self.descstr2       = items[44]
-        self.dgrp           = toInt(items[45])
-        self.dgrpfunc       = toInt(items[46])
-        self.dgrpval        = toInt(items[47])
-        self.dgrpstrpos     = items[48]
-        self.dgrpstrneg     = items[49]
-        self.dgrpstr2       = items[50]
+    SCHEMA = Schema(
+        Column('stat',          'stat',         0),
+        Column('op',            'op',           25, int),
+        Column('opparam',       'op param',     26, int),
+        Column('opbase',        'op base',      27),
+        Column('opstat1',       'op stat1',     28),
+        Column('opstat2',       'op stat2',     29),
+        Column('opstat3',       'op stat3',     30),
+        Column('direct',        'direct',       31, int),
+        Column('maxstat',       'maxstat',      32),
+        Column('descpriority',  'descpriority', 39, int, 0),
+        Column('descfunc',      'descfunc',     40, int),
+        Column('descval',       'descval',      41, int),
+        Column('descstrpos',    'descstrpos',   42),
+        Column('descstrneg',    'descstrneg',   43),
+        Column('descstr2',      'descstr2',     44),
+        Column('dgrp',          'dgrp',         45, int),
+        Column('dgrpfunc',      'dgrpfunc',     46, int),
+        Column('dgrpval',       'dgrpval',      47, int),
+        Column('dgrpstrpos',    'dgrpstrpos',   48),
+        Column('dgrpstrneg',    'dgrpstrneg',   49),
+        Column('dgrpstr2',      'dgrpstr2',     50),
+        indexed = True,
+    )
+    __slots__ = SCHEMA.slots()
 
     def format(self, tblmgr: 'TableManager', min = None, max = None, param = None, funcval = None) -> str:
+        return tblmgr.compiled(self)(min, max, param, funcval)
+
+    def compile(self, tblmgr: 'TableManager'):
         # https://d2mods.info/forum/kb/viewarticle?a=448
+        # strings, op and value layout of this row are resolved once, the returned
+        # format(min, max, param, funcval) only puts the values of one property in
+
+        def skillId(param):
+            if isinstance(param, str):
+                return tblmgr.getSkill(param).id
 
-        descval = self.descval
-        descstr2 = ''
-        value = ''
-        desc = ''
+            return param
 
         match self.descfunc:
             case 1: # +[value] [string1]
-                value = f'{minmax(min, max, sign = True)}'
+                join = self.compileJoin(self.descval)
                 desc = tblmgr.getString(self.descstrpos)
 
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'{minmax(min, max, sign = True)}', desc)
+
             case 2: # [value]% [string1]
-                value = f'{minmax(min, max)}%'
+                join = self.compileJoin(self.descval)
                 desc = tblmgr.getString(self.descstrpos)
 
-            case 3: # [value] [string1]
-                if min is None and max is None:
-                    value = param
-                else:
-                    value = minmax(min, max, sign = True)
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'{minmax(min, max)}%', desc)
 
-                value = f'{value}'
+            case 3: # [value] [string1]
+                join = self.compileJoin(self.descval)
                 desc = tblmgr.getString(self.descstrpos)
 
+                def format(min = None, max = None, param = None, funcval = None):
+                    if min is None and max is None:
+                        value = param
+                    else:
+                        value = minmax(min, max, sign = True)
+
+                    return join(f'{value}', desc)
+
             case 4: # +[value]% [string1]
-                value = f'{minmax(min, max, sign = True)}%'
+                join = self.compileJoin(1)
                 desc = tblmgr.getString(self.descstrpos)
-                descval = 1
+
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'{minmax(min, max, sign = True)}%', desc)
 
             case 5: # [value*100/128]% [string1]
-                value = f'+{minmax((min) * 100 // 128, max * 100 // 128)}%'
+                join = self.compileJoin(self.descval)
                 desc = tblmgr.getString(self.descstrpos)
 
-            case 6: # +[value] [string1] [string2]
-                if isinstance(param, str):
-                    param = tblmgr.getSkill(param).id
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'+{minmax((min) * 100 // 128, max * 100 // 128)}%', desc)
 
-                value = f'+{self.execop(param)}'
+            case 6: # +[value] [string1] [string2]
+                join = self.compileJoin(self.descval)
+                op = self.compileOp()
                 desc = tblmgr.getString(self.descstrpos)
                 descstr2 = tblmgr.getString(self.descstr2)
 
-            case 7: # [value]% [string1] [string2]
-                if isinstance(param, str):
-                    param = tblmgr.getSkill(param).id
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'+{op(skillId(param))}', desc, descstr2)
 
-                value = f'+{self.execop(param)}%'
+            case 7 | 8: # [value]% [string1] [string2] / +[value]% [string1] [string2]
+                join = self.compileJoin(self.descval)
+                op = self.compileOp()
                 desc = tblmgr.getString(self.descstrpos)
                 descstr2 = tblmgr.getString(self.descstr2)
 
-            case 8: # +[value]% [string1] [string2]
-                if isinstance(param, str):
-                    param = tblmgr.getSkill(param).id
-
-                value = f'+{self.execop(param)}%'
-                desc = tblmgr.getString(self.descstrpos)
-                descstr2 = tblmgr.getString(self.descstr2)
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'+{op(skillId(param))}%', desc, descstr2)
 
             case 9: # [value] [string1] [string2]
-                value = f'{self.execop(param)}'
+                join = self.compileJoin(self.descval)
+                op = self.compileOp()
                 desc = tblmgr.getString(self.descstrpos)
                 descstr2 = tblmgr.getString(self.descstr2)
 
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'{op(param)}', desc, descstr2)
+
             case 11: # Repairs 1 Durability In [100 / value] Seconds
-                if isinstance(param, str):
-                    param = tblmgr.getSkill(param).id
+                join = self.compileJoin(self.descval)
 
                 if self.descstr2:
-                    desc = tblmgr.getString(self.descstr2) % (1, 100 // param)
+                    descstr = tblmgr.getString(self.descstr2)
+
+                    def format(min = None, max = None, param = None, funcval = None):
+                        return join('', descstr % (1, 100 // skillId(param)))
+
                 else:
-                    desc = tblmgr.getString(self.descstrpos) % (100 // param)
+                    descstr = tblmgr.getString(self.descstrpos)
+
+                    def format(min = None, max = None, param = None, funcval = None):
+                        return join('', descstr % (100 // skillId(param)))
 
             case 12: # +[value] [string1]
-                value = f'+{minmax(min, max)}'
+                join = self.compileJoin(self.descval)
                 desc = tblmgr.getString(self.descstrpos)
 
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'+{minmax(min, max)}', desc)
+
             case 13: # +[value] to [class] Skill Levels
-                classId = 0 if funcval is None else funcval
-                value = f'+{minmax(min, max)}'
-                desc = f'{tblmgr.getClassSkillName(classId)}'
-                descval = 1
+                join = self.compileJoin(1)
+
+                def format(min = None, max = None, param = None, funcval = None):
+                    classId = 0 if funcval is None else funcval
+                    return join(f'+{minmax(min, max)}', f'{tblmgr.getClassSkillName(classId)}')
 
             case 14: # +[value] to [skilltab] Skill Levels ([class] Only)
-                skillTabId = param
-                if isinstance(skillTabId, str):
-                    skillTabId = tblmgr.getSkill(skillTabId).id
+                join = self.compileJoin(self.descval)
 
-                classId = skillTabId // 3
-                desc = f'+{minmax(min, max)} {tblmgr.getSkillTabName(skillTabId).replace("+%d", "").strip()}{tblmgr.getClassOnly(classId)}'
+                def format(min = None, max = None, param = None, funcval = None):
+                    skillTabId = skillId(param)
+                    classId = skillTabId // 3
+                    return join('', f'+{minmax(min, max)} {tblmgr.getSkillTabName(skillTabId).replace("+%d", "").strip()}{tblmgr.getClassOnly(classId)}')
 
             case 15: # [chance]% to case [slvl] [skill] on [event]
-                skillId = 0 if param is None else param
-                chance = min
-                skillLevel = max
-                desc = tblmgr.getString(self.descstrpos) % (chance, skillLevel or 0, tblmgr.getSkillName(skillId))
+                join = self.compileJoin(self.descval)
+                descstr = tblmgr.getString(self.descstrpos)
+
+                def format(min = None, max = None, param = None, funcval = None):
+                    chance = min
+                    skillLevel = max
+                    return join('', descstr % (chance, skillLevel or 0, tblmgr.getSkillName(0 if param is None else param)))
 
             case 16: # Level [sLvl] [skill] Aura When Equipped
+                join = self.compileJoin(self.descval)
                 descstr = tblmgr.getString(self.descstrpos).replace('%d', '%s')
+                hasValue = descstr.find('%s') != -1
 
-                if param is None:
-                    if descstr.find('%s') != -1:
-                        desc = descstr % minmax(min, max)
-                    else:
-                        desc = descstr
+                def format(min = None, max = None, param = None, funcval = None):
+                    if param is not None:
+                        return join('', descstr % (minmax(min, max), tblmgr.getSkillName(param)))
 
-                else:
-                    desc = descstr % (minmax(min, max), tblmgr.getSkillName(param))
+                    if hasValue:
+                        return join('', descstr % minmax(min, max))
+
+                    return join('', descstr)
 
             case 17: # [value] [string1] (Increases near [time])
-                # 0=day, 1=dusk, 2=night, 3=dawn
+                join = self.compileJoin(self.descval)
+                desc = tblmgr.getString(self.descstrpos)
 
-                if isinstance(param, str):
-                    param = tblmgr.getSkill(param).id
+                # 0=day, 1=dusk, 2=night, 3=dawn
+                times = {
+                    0: tblmgr.getString('ModStre9e'),
+                    1: tblmgr.getString('ModStre9g'),
+                    2: tblmgr.getString('ModStre9d'),
+                    3: tblmgr.getString('ModStre9f'),
+                }
 
-                value = f'{minmax(min, max, sign = True)}'
-                desc = tblmgr.getString(self.descstrpos)
-                descstr2 = tblmgr.getString({
-                    0: 'ModStre9e',
-                    1: 'ModStre9g',
-                    2: 'ModStre9d',
-                    3: 'ModStre9f',
-                }[param])
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'{minmax(min, max, sign = True)}', desc, times[skillId(param)])
 
             case 20: # [value * -1]% [string1]
-                value = f'-{minmax(min, max)}%'
+                join = self.compileJoin(self.descval)
                 desc = tblmgr.getString(self.descstrpos)
 
+                def format(min = None, max = None, param = None, funcval = None):
+                    return join(f'-{minmax(min, max)}%', desc)
+
             case 23: # [value]% [string1] [monster]:
                 # TODO
-                monsterId = param
-                value = f'{minmax(min, max)}%'
-                desc = f'{tblmgr.getString(self.descstrpos)} monsterId<{monsterId}>'
-                descval = 1
+                join = self.compileJoin(1)
+                desc = tblmgr.getString(self.descstrpos)
+
+                def format(min = None, max = None, param = None, funcval = None):
+                    monsterId = param
+                    return join(f'{minmax(min, max)}%', f'{desc} monsterId<{monsterId}>')
 
             case 24: # used for charges, we all know how that desc looks
-                skillId = param
-                count = min
-                skillLevel = max
-                desc = f'{tblmgr.getString("ModStre10b")} {skillLevel} {tblmgr.getSkillName(skillId)} {tblmgr.getString(self.descstrpos) % (count, count)}'
+                join = self.compileJoin(self.descval)
+                level = tblmgr.getString('ModStre10b')
+                descstr = tblmgr.getString(self.descstrpos)
+
+                def format(min = None, max = None, param = None, funcval = None):
+                    count = min
+                    skillLevel = max
+                    return join('', f'{level} {skillLevel} {tblmgr.getSkillName(param)} {descstr % (count, count)}')
 
             case 27: # +[value] to [skill] ([class] Only)
-                skillId = param
-                return f'+{minmax(min, max)} {tblmgr.getSkillName(skillId)}{tblmgr.getSkillClassOnly(skillId)}'
+                def format(min = None, max = None, param = None, funcval = None):
+                    return f'+{minmax(min, max)} {tblmgr.getSkillName(param)}{tblmgr.getSkillClassOnly(param)}'
 
             case 28: # +[value] to [skill]
-                skillId = param
-                skillname = tblmgr.getSkillName(skillId)
-                return f'+{minmax(min, max)} {skillname}'
+                def format(min = None, max = None, param = None, funcval = None):
+                    return f'+{minmax(min, max)} {tblmgr.getSkillName(param)}'
 
             case 29: # magic bag
-                return None
+                def format(min = None, max = None, param = None, funcval = None):
+                    return None
 
             case _:
-                if self.descfunc is None:
-                    # TODO
-                    # ibp()
+                if self.descfunc is not None:
+                    raise NotImplementedError(f'descfunc: {self.descfunc}')
+
+                # TODO
+                # ibp()
+                def format(min = None, max = None, param = None, funcval = None):
                     return None
 
-                raise NotImplementedError(f'descfunc: {self.descfunc}')
+        return format
 
+    def compileJoin(self, descval: int | None):
+        # how value, description and the optional second string end up in one line
         match descval:
             case 0 | None:
-                return desc
+                return lambda value, desc, descstr2 = '': desc
 
             case 1:
-                return f'{value} {desc}{descstr2}'.rstrip()
+                return lambda value, desc, descstr2 = '': f'{value} {desc}{descstr2}'.rstrip()
 
             case 2:
-                return f'{desc} {value}{descstr2}'.rstrip()
+                return lambda value, desc, descstr2 = '': f'{desc} {value}{descstr2}'.rstrip()
 
             case _:
                 raise NotImplementedError(f'unknown descval:\n{self}')
 
-    def execop(self, param: int) -> int:
+    def compileOp(self):
         match self.op:
             case 2:
                 # adds (statvalue * basevalue) / (2 ^ param) to the opstat,
@@ -960,24 +1415,25 @@ class ItemsStatConstTableData(TableData):
                 # similar to passive skills, just because it looks like it works in the item description does not mean it does,
                 # the game just recalculates the information in the description every frame,
                 # while the values remain unchanged serverside.
-
-                return param / (2 ** self.opparam)
+                divisor = 2 ** self.opparam
 
             case 4:
                 # this works the same way op #2 works,
                 # however the stat bonus is added to the item and not to the player
                 # (so that +defense per level properly adds the defense to the armor and not to the character directly!)
-                return param / (2 ** self.opparam)
+                divisor = 2 ** self.opparam
 
             case 5:
                 # this works like op #4 but is percentage based,
                 # it is used for percentage based increase of stats that are found on the item itself,
                 # and not stats that are found on the character.
-                return param / (2 ** self.opparam)
+                divisor = 2 ** self.opparam
 
             case _:
                 raise NotImplementedError(f'unknown op:\n{self}')
 
+        return lambda param: param / divisor
+
     def __str__(self) -> str:
         return '\n'.join([
             f'index         = {self.index}',
@@ -1006,21 +1462,19 @@ class ItemsStatConstTableData(TableData):
 
 class ItemsStatConstTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.data = {}  # type: dict[str, ItemsStatConstTableData]
 
         index = 0
 
-        for l in lines[1:]:
-            if not l:
-                continue
+        extract = ItemsStatConstTableData.extractor(reader)
 
-            l = l.decode('cp1252')
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
 
-            data = ItemsStatConstTableData(index, l)
+            data = extract(cols, index)
             if data.stat == 'Expansion':
                 continue
 
@@ -1034,49 +1488,32 @@ class ItemsStatConstTable:
     def get(self, code: str) -> ItemsStatConstTableData | None:
         return self.data.get(code)
 
-class Property(TableData):
-    def __init__(self, prop: str, param: str, min: str, max: str) -> None:
-        self.prop   = prop
-        self.param  = toInt(param, 0) if not param or param.isdigit() else param
-        self.min    = toInt(min, 0)
-        self.max    = toInt(max, 0)
-
-        self.descpriority   = 0
-
-    def __str__(self) -> str:
-        return '\n'.join([
-            f'prop  = {self.prop}',
-            f'param = {self.param}',
-            f'min   = {self.min}',
-            f'max   = {self.max}',
-        ])
-
 class UniqueItemsTableData(TableData):
-    def __init__(self, line: str):
-        items = self.parse(line)
-        self.index          = items[0]
-        self.version        = items[1]
-        self.enabled        = items[2]
-        self.ladder         = items[3]
-        self.rarity         = items[4]
-        self.nolimit        = items[5]
-        self.lvl            = toInt(items[6])
-        self.lvlreq         = toInt(items[7])
-        self.code           = items[8]
-        self.type           = items[9]
-        self.uber           = items[10]
-        self.carry1         = items[11]
-        self.costmult       = items[12]
-        self.costadd        = items[13]
-        self.chrtransform   = items[14]
-        self.invtransform   = items[15]
-        self.flippyfile     = items[16]
-        self.invfile        = items[17]
-        self.dropsound      = items[18]
-        self.dropsfxframe   = items[19]
-        self.usesound       = items[20]
-
-        self.props = [Property(*p) for p in zip(*[iter(items[21:69])]*4) if p[0]]
+    SCHEMA = Schema(
+        Column('index',         'index',        0),
+        Column('version',       'version',      1),
+        Column('enabled',       'enabled',      2),
+        Column('ladder',        'ladder',       3),
+        Column('rarity',        'rarity',       4),
+        Column('nolimit',       'nolimit',      5),
+        Column('lvl',           'lvl',          6, int),
+        Column('lvlreq',        'lvl req',      7, int),
+        Column('code',          'code',         8),
+        Column('type',          '*type',        9),
+        Column('uber',          'uber',         10),
+        Column('carry1',        'carry1',       11),
+        Column('costmult',      'cost mult',    12),
+        Column('costadd',       'cost add',     13),
+        Column('chrtransform',  'chrtransform', 14),
+        Column('invtransform',  'invtransform', 15),
+        Column('flippyfile',    'flippyfile',   16),
+        Column('invfile',       'invfile',      17),
+        Column('dropsound',     'dropsound',    18),
+        Column('dropsfxframe',  'dropsfxframe', 19),
+        Column('usesound',      'usesound',     20),
+        Records('props',        ['prop{}', 'par{}', 'min{}', 'max{}'], 12, 21, Property.interner, perLoad = True),
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -1087,35 +1524,32 @@ class UniqueItemsTableData(TableData):
 
 class UniqueItemsTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.items = []  # type: list[UniqueItemsTableData]
 
-        for l in lines[1:]:
-            if not l:
-                continue
-
-            l = l.decode('cp1252')
+        extract = UniqueItemsTableData.extractor(reader)
 
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
 
-            data = UniqueItemsTableData(l)
+            data = extract(cols)
             if data.enabled == '' and data.version == '':
                 continue
 
             self.items.append(data)
 
 class RuneWordsTableData(TableData):
-    def __init__(self, line: str):
-        items = self.parse(line)
-
-        self.name       = items[0]
-        self.complete   = toInt(items[2])
-        self.itypes     = [i for i in  items[4:10] if i]
-        self.etypes     = [i for i in  items[10:14] if i]
-        self.runes      = [i for i in  items[14:20] if i]
-        self.props      = [Property(*p) for p in zip(*[iter(items[20:48])]*4) if p[0]]
+    SCHEMA = Schema(
+        Column('name',          'name',         0),
+        Column('complete',      'complete',     2, int),
+        Columns('itypes',       [f'itype{i}' for i in range(1, 7)], 4),
+        Columns('etypes',       [f'etype{i}' for i in range(1, 4)], 10),
+        Columns('runes',        [f'Rune{i}' for i in range(1, 7)], 14),
+        Records('props',        ['T1Code{}', 'T1Param{}', 'T1Min{}', 'T1Max{}'], 7, 20, Property.interner, perLoad = True),
+    )
+    __slots__ = SCHEMA.slots()
 
     def __str__(self) -> str:
         return '\n'.join([
@@ -1129,90 +1563,448 @@ class RuneWordsTableData(TableData):
 
 class RuneWordsTable:
     def __init__(self, filename: str):
-        lines = loadTableFile(filename)
+        reader = TableReader(filename)
 
-        self.headers = TableData.parse(lines[0].decode('UTF8'))
+        self.headers = reader.headers
         self.items = []  # type: list[RuneWordsTableData]
 
-        for l in lines[1:]:
-            if not l:
-                continue
-
-            l = l.decode('cp1252')
+        extract = RuneWordsTableData.extractor(reader)
 
-            # printList(TableData.parse(l), self.headers)
+        for cols in reader.rows(extract.width):
+            # printList(cols, self.headers)
             # raise
 
-            data = RuneWordsTableData(l)
+            data = extract(cols)
             if not data.complete:
                 continue
 
             self.items.append(data)
 
+def sharedObjects(table) -> list:
+    # the rows of a table and the records in them, in a stable order. an index pickled into the
+    # snapshot refers to these by position, so once loaded it shares them with the table
+    objects = []
+    for row in TableDatabase.tableRows(table):
+        objects.append(row)
+        for column in type(row).SCHEMA.columns:
+            if isinstance(column, Records):
+                objects.extend(getattr(row, column.attr))
+
+    return objects
+
+class SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, shared: dict[int, tuple[str, int]]):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.shared = shared
+
+    def persistent_id(self, obj):
+        return self.shared.get(id(obj))
+
+class SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, tables):
+        super().__init__(file)
+        self.tables     = tables
+        self.objects    = {}    # type: dict[str, list]
+
+    def persistent_load(self, pid: tuple[str, int]):
+        name, i = pid
+
+        objects = self.objects.get(name)
+        if objects is None:
+            objects = self.objects[name] = sharedObjects(self.tables(name))
+
+        return objects[i]
+
+class Snapshot:
+    # one pickled blob per table, keyed by (size, mtime, digest) of every source file.
+    # mtime is only a shortcut: a touched but unchanged file is verified by its digest.
+    # indexes are pickled with references to the rows of their source tables instead of copies,
+    # get() resolves them through `tables(name)`
+
+    def __init__(self, filename: str | None):
+        self.filename   = filename
+        self.entries    = {}    # type: dict[str, tuple[list[tuple[int, int, bytes]], bytes]]
+        self.dirty      = False
+
+        if filename is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                version, *data = pickle.load(f)
+
+        except FileNotFoundError:
+            return
+
+        except Exception as e:
+            logger.warning('ignore broken snapshot %s: %r', self.filename, e)
+            return
+
+        # older layouts are dropped quietly, only this version is (version, code digest, entries)
+        if version == SNAPSHOT_VERSION and data[0] == codeDigest():
+            self.entries = data[1]
+
+    def save(self):
+        if self.filename is None or not self.dirty:
+            return
+
+        tmpname = f'{self.filename}.tmp'
+
+        with open(tmpname, 'wb') as f:
+            pickle.dump((SNAPSHOT_VERSION, codeDigest(), self.entries), f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmpname, self.filename)
+        self.dirty = False
+
+    def signature(self, filenames: list[str]) -> list[tuple[int, int, bytes]]:
+        sig = []
+        for filename in filenames:
+            st = os.stat(filename)
+            sig.append((st.st_size, st.st_mtime_ns, fileDigest(filename)))
+
+        return sig
+
+    def isFresh(self, sig: list[tuple[int, int, bytes]], filenames: list[str]) -> bool:
+        if len(sig) != len(filenames):
+            return False
+
+        for i, filename in enumerate(filenames):
+            size, mtime, digest = sig[i]
+
+            try:
+                st = os.stat(filename)
+            except FileNotFoundError:
+                return False
+
+            if st.st_size != size:
+                return False
+
+            if st.st_mtime_ns == mtime:
+                continue
+
+            if fileDigest(filename) != digest:
+                return False
+
+            # touched but unchanged, remember the new mtime so we won't hash it again
+            sig[i] = (size, st.st_mtime_ns, digest)
+            self.dirty = True
+
+        return True
+
+    def get(self, name: str, filenames: list[str], tables = None):
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+
+        sig, blob = entry
+        if not self.isFresh(sig, filenames):
+            return None
+
+        try:
+            if tables is None:
+                return pickle.loads(blob)
+
+            return SnapshotUnpickler(io.BytesIO(blob), tables).load()
+
+        except Exception as e:
+            logger.warning('ignore broken snapshot entry %s: %r', name, e)
+            return None
+
+    def put(self, name: str, filenames: list[str], value, tables: dict | None = None):
+        # `tables` are the loaded tables whose rows `value` may refer to instead of copying
+        if tables is None:
+            blob = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        else:
+            shared = {}
+            for source, table in tables.items():
+                for i, obj in enumerate(sharedObjects(table)):
+                    shared.setdefault(id(obj), (source, i))
+
+            f = io.BytesIO()
+            SnapshotPickler(f, shared).dump(value)
+            blob = f.getvalue()
+
+        self.entries[name] = (self.signature(filenames), blob)
+        self.dirty = True
+
+class BaseItem(TableData):
+    # a weapons / armor / misc row with its category, global index (the `i{index}` in the docs)
+    # and localized name (None without a string)
+
+    __slots__ = ('code', 'category', 'index', 'name', 'row')
+
+    def __init__(self, category: str, row: 'WeaponsTableData | ArmorTableData | MiscTableData', name: str | None):
+        self.code       = row.code
+        self.category   = category
+        self.index      = row.index
+        self.name       = name
+        self.row        = row
+
+    def __str__(self) -> str:
+        return f'{self.category} i{self.index} {self.code} {self.name}'
+
+class BaseItemIndex:
+    # every base item by code, a code found in several tables belongs to the first one like the old probe order.
+    # `items` keeps all of them in listing order: weapons, armor, misc, each by index
+
+    def __init__(self, weapons: 'WeaponsTable', armor: 'ArmorTable', misc: 'MiscTable', strings: 'StringIndex'):
+        self.data       = {}    # type: dict[str, BaseItem]
+        self.items      = []    # type: list[BaseItem]
+
+        for category, tbl in [('weapon', weapons), ('armor', armor), ('misc', misc)]:
+            for row in sorted(tbl.data.values(), key = lambda row: row.index):
+                item = BaseItem(category, row, strings.data.get(row.code))
+                self.items.append(item)
+                self.data.setdefault(item.code, item)
+
+    def get(self, code: str) -> BaseItem | None:
+        return self.data.get(code)
+
+class Grant(TableData):
+    # one property line of a unique item, rune word or gem socket slot,
+    # `row` is the position in that table and `name` its string key (the gem code for gems)
+
+    __slots__ = ('table', 'row', 'name', 'slot', 'prop')
+
+    def __init__(self, table: str, row: int, name: str, slot: str | None, prop: Property):
+        self.table  = table
+        self.row    = row
+        self.name   = name
+        self.slot   = slot
+        self.prop   = prop
+
+    @property
+    def min(self) -> int:
+        return self.prop.min
+
+    @property
+    def max(self) -> int:
+        return self.prop.max
+
+    def __str__(self) -> str:
+        slot = f' ({self.slot})' if self.slot else ''
+        return f'{self.table}[{self.row}] {self.name}{slot}: {self.prop.prop} {self.prop.param} {self.prop.min}-{self.prop.max}'
+
+class GrantIndex:
+    # which items grant a property code, a (code, param) pair or an itemstatcost stat
+
+    def __init__(self, uniqueitems: 'UniqueItemsTable', runes: 'RuneWordsTable', gems: 'GemsTable', properties: 'PropertyTable'):
+        self.byProp     = {}    # type: dict[str, list[Grant]]
+        self.byParam    = {}    # type: dict[tuple[str, str | int], list[Grant]]
+        self.byStat     = {}    # type: dict[str, list[Grant]]
+
+        stats = {}
+        for code, prop in properties.data.items():
+            stats[code] = list(dict.fromkeys(f.stat for f in prop.funcs if f.stat))
+
+        for i, item in enumerate(uniqueitems.items):
+            for prop in item.props:
+                self.add(Grant('uniqueitems', i, item.index, None, prop), stats)
+
+        for i, rw in enumerate(runes.items):
+            for prop in rw.props:
+                self.add(Grant('runes', i, rw.name, None, prop), stats)
+
+        for i, gem in enumerate(gems.data.values()):
+            for slot, props in [('weapon', gem.weaponProps), ('helm', gem.helmProps), ('shield', gem.shieldProps)]:
+                for prop in props:
+                    self.add(Grant('gems', i, gem.code, slot, prop), stats)
+
+    def add(self, grant: Grant, stats: dict[str, list[str]]):
+        prop = grant.prop
+        self.byProp.setdefault(prop.prop, []).append(grant)
+        self.byParam.setdefault((prop.prop, prop.param), []).append(grant)
+
+        for stat in stats.get(prop.prop, ()):
+            self.byStat.setdefault(stat, []).append(grant)
+
+    def grants(self, prop: str, param: str | int | None = None) -> list[Grant]:
+        if param is None:
+            return self.byProp.get(prop, [])
+
+        return self.byParam.get((prop, param), [])
+
+    def grantsStat(self, stat: str) -> list[Grant]:
+        return self.byStat.get(stat, [])
+
 class TableManager:
-    def __init__(self):
-        self.string             = StringTable('string.txt')
-        self.expansionstring    = StringTable('expansionstring.txt')
-        self.patchstring        = StringTable('patchstring.txt')
-        self.weapons            = WeaponsTable('weapons.txt')
-        self.armor              = ArmorTable('armor.txt')
-        self.misc               = MiscTable('misc.txt')
-        self.gems               = GemsTable('gems.txt')
-        self.properties         = PropertyTable('properties.txt')
-        self.itemstatcost       = ItemsStatConstTable('itemstatcost.txt')
-        self.charstats          = CharStatTable('charstats.txt')
-        self.skills             = SkillTable('skills.txt')
-        self.skilldesc          = SkillDescTable('skilldesc.txt')
+    TABLES = {
+        'string'            : (StringTable,         'string.txt'),
+        'expansionstring'   : (StringTable,         'expansionstring.txt'),
+        'patchstring'       : (StringTable,         'patchstring.txt'),
+        'weapons'           : (WeaponsTable,        'weapons.txt'),
+        'armor'             : (ArmorTable,          'armor.txt'),
+        'misc'              : (MiscTable,           'misc.txt'),
+        'gems'              : (GemsTable,           'gems.txt'),
+        'properties'        : (PropertyTable,       'properties.txt'),
+        'itemstatcost'      : (ItemsStatConstTable, 'itemstatcost.txt'),
+        'charstats'         : (CharStatTable,       'charstats.txt'),
+        'skills'            : (SkillTable,          'skills.txt'),
+        'skilldesc'         : (SkillDescTable,      'skilldesc.txt'),
+        'uniqueitems'       : (UniqueItemsTable,    'uniqueitems.txt'),
+        'runes'             : (RuneWordsTable,      'runes.txt'),
+    }
+
+    # derived from the tables above (or earlier indexes), rebuilt when any of their sources change
+    INDEXES = {
+        'strings'           : (StringIndex,         ['string', 'expansionstring', 'patchstring']),
+        'baseitems'         : (BaseItemIndex,       ['weapons', 'armor', 'misc', 'strings']),
+        'grants'            : (GrantIndex,          ['uniqueitems', 'runes', 'gems', 'properties']),
+    }
+
+    def __init__(self, snapshot: str | None = SNAPSHOT_FILE):
+        # tables are loaded on first access, see __getattr__
+        self.snapshot   = Snapshot(snapshot)
+        self.touched    = []    # type: list[str]
+        self.recorder   = None  # type: set[tuple[str, object]] | None
+        self.functions  = {}    # type: dict[TableData, tuple[object, frozenset, int]]
+
+    # loaded lazily by __getattr__, annotations only
+    string          : StringTable
+    expansionstring : StringTable
+    patchstring     : StringTable
+    weapons         : WeaponsTable
+    armor           : ArmorTable
+    misc            : MiscTable
+    gems            : GemsTable
+    properties      : PropertyTable
+    itemstatcost    : ItemsStatConstTable
+    charstats       : CharStatTable
+    skills          : SkillTable
+    skilldesc       : SkillDescTable
+    uniqueitems     : UniqueItemsTable
+    runes           : RuneWordsTable
+    strings         : StringIndex
+    baseitems       : BaseItemIndex
+    grants          : GrantIndex
+
+    def __getattr__(self, name: str):
+        # only called when the attribute does not exist yet,
+        # once loaded the table is a plain instance attribute
+        if name in self.TABLES:
+            table = self.loadTable(name)
+
+        elif name in self.INDEXES:
+            table = self.loadIndex(name)
+
+        else:
+            raise AttributeError(name)
+
+        setattr(self, name, table)
+        self.touched.append(name)
+        return table
+
+    def loadTable(self, name: str):
+        cls, filename = self.TABLES[name]
+
+        table = self.snapshot.get(name, [filename])
+        if table is None:
+            log('rebuild table %s from %s', name, filename)
+            table = cls(filename)
+            self.snapshot.put(name, [filename], table)
+
+        return table
+
+    def sourceFiles(self, name: str) -> list[str]:
+        # the table files a table or (possibly index based) index is built from
+        if name in self.TABLES:
+            return [self.TABLES[name][1]]
+
+        filenames = []
+        for source in self.INDEXES[name][1]:
+            filenames.extend(f for f in self.sourceFiles(source) if f not in filenames)
+
+        return filenames
+
+    def loadIndex(self, name: str):
+        cls, sources = self.INDEXES[name]
+        filenames = self.sourceFiles(name)
+
+        # table rows the index holds are stored as references and resolved against the loaded tables
+        index = self.snapshot.get(name, filenames, lambda source: getattr(self, source))
+        if index is None:
+            log('rebuild index %s from %s', name, sources)
+            index = cls(*[getattr(self, source) for source in sources])
+            self.snapshot.put(name, filenames, index, {source: getattr(self, source) for source in sources if source in self.TABLES})
+
+        return index
+
+    def preload(self, names: list[str] | None = None):
+        for name in self.TABLES if names is None else names:
+            getattr(self, name)
+
+    def touchedTables(self) -> list[str]:
+        return list(self.touched)
+
+    def saveSnapshot(self):
+        self.snapshot.save()
 
     def strip(self, s: str) -> str:
-        for p in USELESS_CHARS.findall(s):
-            s = s.replace(p, '')
-
-        return s.strip()
+        return cleanString(s)
 
     def getString2(self, key: str) -> str:
-        for t in [self.patchstring, self.expansionstring, self.string]:
-            try:
-                return t.get(key)
-            except KeyError:
-                pass
+        if self.recorder is not None:
+            self.recorder.add(('strings', key))
 
-        return None
+        return self.strings.data.get(key)
 
     def getString(self, key: str) -> str:
-        for t in [self.patchstring, self.expansionstring, self.string]:
-            try:
-                return t.get(key)
-            except KeyError:
-                pass
+        if self.recorder is not None:
+            self.recorder.add(('strings', key))
+
+        value = self.strings.data.get(key)
+        if value is None:
+            return f'<missing string>[{key}]'
+
+        return value
+
+    def getColoredString(self, key: str) -> str:
+        if self.recorder is not None:
+            self.recorder.add(('strings', key))
 
-        return f'<missing string>[{key}]'
+        value = self.strings.colored.get(key)
+        if value is None:
+            return self.getString(key)
+
+        return value
 
     def getStringByIndex(self, index: int) -> str:
-        if 0 <= index < 10000:
-            return self.string.getIndex(index)
+        if self.recorder is not None:
+            self.recorder.add(('stringindex', index))
+
+        value = self.strings.byIndex.get(index)
+        if value is None:
+            raise KeyError(f'no string with index {index}')
 
-        if 10000 <= index < 20000:
-            return self.patchstring.getIndex(index - 10000)
+        return value
 
-        if 20000 <= index < 30000:
-            return self.expansionstring.getIndex(index - 20000)
+    def getCharStat(self, charclass: int) -> CharStatTableData:
+        if self.recorder is not None:
+            self.recorder.add(('charstats', charclass))
 
-        raise NotImplementedError(f'invalid index: {index}')
+        return self.charstats.get(charclass)
 
     def getClassSkillName(self, charclass: int) -> str:
-        return self.getString(self.charstats.get(charclass).allSkills)
+        return self.getString(self.getCharStat(charclass).allSkills)
 
     def getSkill(self, skillId: int | str) -> SkillTableData:
+        if self.recorder is not None:
+            self.recorder.add(('skills', skillId))
+
         return self.skills.get(skillId)
 
     def getSkillName(self, skillId: int | str) -> str:
         skill = self.getSkill(skillId)
+
+        if self.recorder is not None:
+            self.recorder.add(('skilldesc', skill.skilldesc))
+
         skdesc = self.skilldesc.get(skill.skilldesc)
         return self.getStringByIndex(skdesc.strname)
 
     def getSkillClassOnly(self, skillId: int) -> str:
-        skill = self.skills.get(skillId)
+        skill = self.getSkill(skillId)
         if skill.charclass == 0xFF:
             return ''
 
@@ -1220,10 +2012,106 @@ class TableManager:
 
     def getSkillTabName(self, skillTabId: int) -> str:
         classId = skillTabId // 3
-        return self.getString(self.charstats.get(classId).skillTabs[int(skillTabId % 3)])
+        return self.getString(self.getCharStat(classId).skillTabs[int(skillTabId % 3)])
 
     def getClassOnly(self, classId: int) -> str:
-        return self.getString(self.charstats.get(classId).classOnly)
+        return self.getString(self.getCharStat(classId).classOnly)
+
+    def getWeapon(self, code: str) -> WeaponsTableData | None:
+        if self.recorder is not None:
+            self.recorder.add(('weapons', code))
+
+        return self.weapons.get(code)
+
+    def getArmor(self, code: str) -> ArmorTableData | None:
+        if self.recorder is not None:
+            self.recorder.add(('armor', code))
+
+        return self.armor.get(code)
+
+    def getMisc(self, code: str) -> MiscTableData | None:
+        if self.recorder is not None:
+            self.recorder.add(('misc', code))
+
+        return self.misc.get(code)
+
+    def getBaseItem(self, code: str) -> BaseItem | None:
+        if self.recorder is not None:
+            self.recorder.add(('baseitems', code))
+
+        return self.baseitems.get(code)
+
+    def getGem(self, code: str) -> GemsTableData:
+        if self.recorder is not None:
+            self.recorder.add(('gems', code))
+
+        return self.gems.get(code)
+
+    def getProperty(self, code: str) -> PropertyTableData:
+        if self.recorder is not None:
+            self.recorder.add(('properties', code))
+
+        return self.properties.get(code)
+
+    def getItemStat(self, stat: str) -> ItemsStatConstTableData | None:
+        if self.recorder is not None:
+            self.recorder.add(('itemstatcost', stat))
+
+        return self.itemstatcost.get(stat)
+
+    def compiled(self, row: 'ItemsStatConstTableData | PropertyTableData'):
+        # the function row.compile() built for this manager (functions don't pickle, so they are
+        # never part of the snapshot), with the rows and strings compiling it read as dependencies.
+        # built again once instruments are switched on or off, so timing follows the switch
+        entry = self.functions.get(row)
+        if entry is None or entry[2] != instruments.generation:
+            with self.recording() as deps:
+                function = row.compile(self)
+
+            entry = self.functions[row] = (function, frozenset(deps), instruments.generation)
+
+        elif self.recorder is not None:
+            self.recorder.update(entry[1])
+
+        return entry[0]
+
+    @contextlib.contextmanager
+    def recording(self, enabled: bool = True):
+        # collects the (table, key) of every row read through the get* accessors,
+        # nested recordings also report into the enclosing one
+        if not enabled:
+            yield None
+            return
+
+        previous = self.recorder
+        self.recorder = deps = set()
+
+        try:
+            yield deps
+
+        finally:
+            self.recorder = previous
+            if previous is not None:
+                previous.update(deps)
+
+    def lookup(self, table: str, key):
+        # the current row behind a recorded dependency, None when it's gone
+        match table:
+            case 'strings':
+                return self.strings.data.get(key)
+
+            case 'stringindex':
+                return self.strings.byIndex.get(key)
+
+            case 'skills':
+                return self.skills.data.get(key) if isinstance(key, int) else self.skills.dataByName.get(key)
+
+            case 'skilldesc' | 'charstats':
+                data = getattr(self, table).data
+                return data[key] if 0 <= key < len(data) else None
+
+            case _:
+                return getattr(self, table).data.get(key)
 
     def getBuiltinItemType(self, code: str) -> str:
         return {
@@ -1286,40 +2174,210 @@ class MarkdownHelper:
     def text(self) -> tuple[str]:
         return self.lines
 
+class PropertyCache:
+    # bounded LRU of rendered properties keyed by the (immutable) Property itself
+
+    def __init__(self, maxsize: int = 4096):
+        self.data       = OrderedDict()     # type: OrderedDict[Property, RenderedProperty]
+        self.maxsize    = maxsize
+        self.hits       = 0
+        self.misses     = 0
+
+    def get(self, key: Property) -> RenderedProperty | None:
+        entry = self.data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Property, entry: RenderedProperty):
+        self.data[key] = entry
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last = False)
+
+    def clear(self):
+        self.data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self) -> str:
+        total = self.hits + self.misses
+        ratio = self.hits / total if total else 0
+        return f'{len(self.data)}/{self.maxsize} entries, {self.hits} hits, {self.misses} misses ({ratio:.1%})'
+
+class ItemModel:
+    # everything an emitter needs to know about one generated item, already resolved to display strings.
+    # requirements are (key, label, value) and properties (lines, descpriority), both in display order;
+    # rune words have no base item but list their item types, runes and per-slot rune properties
+
+    __slots__ = (
+        'category', 'name', 'typename', 'code', 'index', 'desc', 'requirements', 'properties',
+        'itypes', 'itypeNames', 'runes', 'runeProperties',
+    )
+
+    def __init__(
+        self,
+        category        : str,
+        name            : str,
+        typename        : str | None = None,
+        code            : str | None = None,
+        index           : int | None = None,
+        *,
+        desc            : str | None = None,
+        requirements    : list[tuple[str, str, int]] = (),
+        properties      : list[tuple[tuple[str, ...], int]] = (),
+        itypes          : list[str] = (),
+        itypeNames      : list[str] = (),
+        runes           : list[str] = (),
+        runeProperties  : list[tuple[str, list[tuple[str, str]]]] = (),
+    ):
+        self.category       = category
+        self.name           = name
+        self.typename       = typename
+        self.code           = code
+        self.index          = index
+        self.desc           = desc
+        self.requirements   = requirements
+        self.properties     = properties
+        self.itypes         = itypes
+        self.itypeNames     = itypeNames
+        self.runes          = runes
+        self.runeProperties = runeProperties
+
+    def asDict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return f'<{self.category} {self.name}>'
+
+class ItemLayout:
+    # how one base item category is described: where its type name comes from,
+    # an optional base row description and the requirement lines in display order
+
+    def __init__(
+        self,
+        category        : str,
+        *,
+        typename        : str | None = None,
+        optional        : bool = False,
+        desc            = None,
+        requirements    : list[tuple[str, str, str]],
+    ):
+        self.category       = category
+        self.typename       = typename          # base row attr holding the name string key, None for the item's own name
+        self.optional       = optional          # no name string: skip the item instead of `<missing string>`
+        self.desc           = desc              # (tblmgr, base row) -> string key | None
+        self.requirements   = requirements      # (attr, label string key, 'base' | 'unique')
+
+LAYOUTS = {
+    'weapon'    : ItemLayout(
+        'weapon',
+        desc            = lambda tblmgr, baseItem: tblmgr.weapons.getWeaponDesc(baseItem),
+        requirements    = [
+            ('durability',  'ItemStats1d',  'base'),
+            ('reqdex',      'ItemStats1f',  'base'),
+            ('reqstr',      'ItemStats1e',  'base'),
+            ('lvlreq',      'ItemStats1p',  'unique'),
+        ],
+    ),
+    'armor'     : ItemLayout(
+        'armor',
+        requirements    = [
+            ('durability',  'ItemStats1d',  'base'),
+            ('reqstr',      'ItemStats1e',  'base'),
+            ('reqdex',      'ItemStats1f',  'base'),
+            ('lvlreq',      'ItemStats1p',  'unique'),
+        ],
+    ),
+    'misc'      : ItemLayout(
+        'misc',
+        typename        = 'namestr',
+        optional        = True,
+        requirements    = [
+            ('lvlreq',      'ItemStats1p',  'unique'),
+        ],
+    ),
+}
+
+def traceable(key):
+    # debug logging for the items named in `parser.trace` (by string key or localized name) only,
+    # everything else runs the method as is
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self: 'TableParser', item, *args):
+            if self.trace:
+                name = key(item)
+                if name in self.trace or self.tblmgr.getString2(name) in self.trace:
+                    with self.tracing():
+                        return method(self, item, *args)
+
+            return method(self, item, *args)
+
+        return wrapper
+    return decorate
+
 class TableParser:
-    def __init__(self):
-        self.tblmgr = TableManager()
+    def __init__(self, snapshot: str | None = SNAPSHOT_FILE, cacheSize: int = 4096):
+        self.tblmgr         = TableManager(snapshot)
+        self.propertyCache  = PropertyCache(cacheSize)
+        self.trace          = set()     # type: set[str]
+        self.traced         = False
+
+    @contextlib.contextmanager
+    def tracing(self):
+        # debug output on and the property cache bypassed, so every line is rendered (and logged) again
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        self.traced = True
+
+        try:
+            yield
+        finally:
+            logger.setLevel(level)
+            self.traced = False
 
     def getUniqueItemType(self, item: UniqueItemsTableData) -> str:
-        if self.tblmgr.weapons.get(item.code) is not None:
-            return 'weapon'
+        baseItem = self.tblmgr.getBaseItem(item.code)
+        if baseItem is None:
+            raise NotImplementedError(f'{item}')
 
-        if self.tblmgr.armor.get(item.code) is not None:
-            return 'armor'
+        return baseItem.category
 
-        if self.tblmgr.misc.get(item.code) is not None:
-            return 'misc'
+    @traceable(lambda item: item.index)
+    def describeUniqueItem(self, item: UniqueItemsTableData) -> 'ItemModel | None':
+        baseItem = self.tblmgr.getBaseItem(item.code)
+        if baseItem is None:
+            raise NotImplementedError(f'{item}')
 
-        raise NotImplementedError(f'{item}')
+        return self.describeBaseItem(item, LAYOUTS[baseItem.category], baseItem)
 
     def formatUniqueItem(self, item: UniqueItemsTableData) -> list[str]:
-        baseItem = self.tblmgr.weapons.get(item.code)
-        if baseItem is not None:
-            return self.formatWeapon(item, baseItem)
+        return MarkdownEmitter.format(self.describeUniqueItem(item))
+
+    def renderProperty(self, prop: Property) -> RenderedProperty:
+        tblmgr = self.tblmgr
+        rendered = self.propertyCache.get(prop)
 
-        baseItem = self.tblmgr.armor.get(item.code)
-        if baseItem is not None:
-            return self.formatArmor(item, baseItem)
+        if rendered is None or self.traced or (tblmgr.recorder is not None and rendered.deps is None):
+            with tblmgr.recording(tblmgr.recorder is not None) as deps:
+                rendered = tblmgr.compiled(tblmgr.getProperty(prop.prop))(prop)
 
-        baseItem = self.tblmgr.misc.get(item.code)
-        if baseItem is not None:
-            return self.formatMisc(item, baseItem)
+            if deps is not None:
+                rendered.deps = frozenset(deps)
 
-        return []
+            self.propertyCache.put(prop, rendered)
+
+        elif tblmgr.recorder is not None:
+            # a cached render still depends on the rows it read the first time
+            tblmgr.recorder.update(rendered.deps)
+
+        return rendered
 
     def formatProperty(self, prop: Property) -> list[str]:
-        p = self.tblmgr.properties.get(prop.prop)
-        return p.format(prop, self.tblmgr)
+        return list(self.renderProperty(prop).lines)
 
     def formatProperties(self, props: list[Property]) -> str:
         lines = []
@@ -1328,272 +2386,1232 @@ class TableParser:
 
         return '，'.join(lines)
 
-    def formatWeapon(self, uniqueItem: UniqueItemsTableData, baseItem: WeaponsTableData) -> list[str]:
-        weapDesc = self.tblmgr.weapons.getWeaponDesc(baseItem)
-        name = self.tblmgr.getString(uniqueItem.index)
-        weapTypename = self.tblmgr.getString(baseItem.code)
+    def renderProperties(self, props: list[Property]) -> list[tuple[tuple[str, ...], int]]:
+        # (lines, descpriority) of every property that renders to something, in display order
+        rendered = [self.renderProperty(prop) for prop in props]
 
-        md = MarkdownHelper()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('%s\n', '\n'.join(line for p in rendered for line in p.lines))
 
-        md.line(f'### {md.uniqueColor(name)}')
-        md.line(f'### {md.uniqueColor(weapTypename)} [`i{baseItem.index}`] [`{baseItem.code}`]')
+        return [(p.lines, p.descpriority) for p in sorted(rendered, reverse = True, key = lambda p: p.descpriority) if p.lines]
 
-        md.blank()
+    def describeBaseItem(self, uniqueItem: UniqueItemsTableData, layout: ItemLayout, base: BaseItem) -> 'ItemModel | None':
+        tblmgr = self.tblmgr
+        baseItem = base.row
+        name = tblmgr.getString(uniqueItem.index)
 
-        if weapDesc is not None:
-            md.line(self.tblmgr.getString(weapDesc))
+        key = base.code if layout.typename is None else getattr(baseItem, layout.typename)
+        typename = base.name if layout.typename is None else tblmgr.getString2(key)
 
-        if baseItem.durability is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1d")}{baseItem.durability}')
+        if typename is None:
+            if layout.optional:
+                return None
 
-        if baseItem.reqdex is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1f")}{baseItem.reqdex}')
+            # for its `<missing string>` placeholder
+            typename = tblmgr.getString(key)
 
-        if baseItem.reqstr is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1e")}{baseItem.reqstr}')
+        logger.debug('********** %s %s %s *********', uniqueItem.index, name, typename)
 
-        if uniqueItem.lvlreq is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1p")}{uniqueItem.lvlreq}')
+        desc = None
+        if layout.desc is not None:
+            desc = layout.desc(tblmgr, baseItem)
+            if desc is not None:
+                desc = tblmgr.getString(desc)
 
-        md.blank()
+        requirements = []
+        for attr, label, owner in layout.requirements:
+            value = getattr(baseItem if owner == 'base' else uniqueItem, attr)
+            if value is not None:
+                requirements.append((attr, tblmgr.getString(label), value))
 
-        log(f'********** {uniqueItem.index} {name} {weapTypename} *********')
+        return ItemModel(
+            layout.category, name, typename, base.code, base.index,
+            desc            = desc,
+            requirements    = requirements,
+            properties      = self.renderProperties(uniqueItem.props),
+        )
 
-        props = []
-        for prop in uniqueItem.props:
-            props.append([prop, self.formatProperty(prop)])
-            log('\n'.join(['\n'.join(p[1]) for p in props if p[1]]))
-            log()
+    @traceable(lambda rw: rw.name)
+    def describeRuneWord(self, rw: RuneWordsTableData) -> 'ItemModel':
+        name = self.tblmgr.getString(rw.name)
+        itypeNames = [s for s in [self.tblmgr.getBuiltinItemType(it) for it in rw.itypes] if s]
 
-        for p in sorted(props, reverse = True, key = lambda p: p[0].descpriority):
-            if p[1]:
-                descpriority = p[0].descpriority
-                for p in p[1]:
-                    md.line(f'{p}')
+        logger.debug('********** %s %s *********', name, '/'.join(itypeNames))
 
-        log('\n'.join(md.text()))
+        properties = self.renderProperties(rw.props)
 
-        # if name.count('刮肉者'): raise
+        runeProperties = []
+        for itype, slot, getprops in [
+            ('rwt1', '武器', lambda r: r.weaponProps),
+            ('rwt2', '装甲', lambda r: r.helmProps),
+            ('rwt3', '盾牌', lambda r: r.shieldProps),
+        ]:
+            if itype in rw.itypes:
+                runeProperties.append((slot, [(runeCode, self.formatProperties(getprops(self.tblmgr.getGem(runeCode)))) for runeCode in rw.runes]))
+
+        return ItemModel(
+            'runewords', name,
+            properties      = properties,
+            itypes          = list(rw.itypes),
+            itypeNames      = itypeNames,
+            runes           = list(rw.runes),
+            runeProperties  = runeProperties,
+        )
 
-        return md.text()
+    def formatRuneWord(self, rw: RuneWordsTableData) -> list[str]:
+        return MarkdownEmitter.format(self.describeRuneWord(rw))
+
+class Instruments:
+    # runtime switchable telemetry. enable() wraps the measured methods in place and disable()
+    # puts the originals back, so nothing is paid while it is off.
+    # counts are per process, with -j only the main process (table loads) is covered and report()
+    # says so for the render sections.
+    # format and render are timed through the functions TableManager.compiled() builds, every switch
+    # bumps `generation` so functions compiled before it are built again
+
+    def __init__(self, slowest: int = 20):
+        self.slowest    = slowest
+        self.patches    = []    # type: list[tuple[type, str, object]]
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        self.tables     = {}    # type: dict[str, list]          # name -> [seconds, rows]
+        self.descfuncs  = {}    # type: dict[int | None, list]   # descfunc -> [calls, seconds]
+        self.funcs      = {}    # type: dict[str, list]          # func chain -> [calls, seconds]
+        self.strings    = [0, 0]                                  # StringIndex hits, misses
+        self.compiled   = [0, 0]                                  # compiled function hits, builds
+        self.items      = []    # type: list[tuple[float, str, str]]
+        self.cleanBase  = cleanString.cache_info()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.patches)
+
+    def patch(self, cls: type, name: str, wrap):
+        original = cls.__dict__[name]
+        self.patches.append((cls, name, original))
+        setattr(cls, name, functools.wraps(original)(wrap(original)))
+
+    def enable(self):
+        if self.enabled:
+            return
+
+        clock = time.perf_counter
+        self.reset()
+
+        def load(kind: str):
+            def wrap(original):
+                def loadTimed(tblmgr: TableManager, name: str):
+                    start = clock()
+                    table = original(tblmgr, name)
+                    rows = getattr(table, 'items', None) or getattr(table, 'data', ())
+                    self.tables[f'{kind}{name}'] = [clock() - start, len(rows)]
+                    return table
+
+                return loadTimed
+            return wrap
+
+        def formatTimed(original):
+            def compile(itemstat: ItemsStatConstTableData, tblmgr: TableManager):
+                format = original(itemstat, tblmgr)
+                descfunc = itemstat.descfunc
+
+                def formatTimed(*args, **kwargs):
+                    start = clock()
+                    try:
+                        return format(*args, **kwargs)
+                    finally:
+                        entry = self.descfuncs.setdefault(descfunc, [0, 0.0])
+                        entry[0] += 1
+                        entry[1] += clock() - start
+
+                return formatTimed
+            return compile
+
+        def renderTimed(original):
+            def compile(propdata: PropertyTableData, tblmgr: TableManager):
+                render = original(propdata, tblmgr)
+                funcs = '+'.join(str(f.func) for f in propdata.funcs)
+
+                def renderTimed(prop: Property):
+                    start = clock()
+                    try:
+                        return render(prop)
+                    finally:
+                        entry = self.funcs.setdefault(funcs, [0, 0.0])
+                        entry[0] += 1
+                        entry[1] += clock() - start
+
+                return renderTimed
+            return compile
+
+        def stringCounted(lookup):
+            def wrap(original):
+                def getString(tblmgr: TableManager, key):
+                    self.strings[key not in lookup(tblmgr.strings)] += 1
+                    return original(tblmgr, key)
+
+                return getString
+            return wrap
+
+        def compiledCounted(original):
+            def compiled(tblmgr: TableManager, row):
+                entry = tblmgr.functions.get(row)
+                self.compiled[entry is None or entry[2] != self.generation] += 1
+                return original(tblmgr, row)
+
+            return compiled
+
+        def describeTimed(table: str, name):
+            def wrap(original):
+                def describe(parser: TableParser, item, *args):
+                    start = clock()
+                    try:
+                        return original(parser, item, *args)
+                    finally:
+                        entry = (clock() - start, table, name(item))
+                        if len(self.items) < self.slowest:
+                            heapq.heappush(self.items, entry)
+                        else:
+                            heapq.heappushpop(self.items, entry)
+
+                return describe
+            return wrap
+
+        self.patch(TableManager, 'loadTable', load(''))
+        self.patch(TableManager, 'loadIndex', load('index:'))
+        self.patch(ItemsStatConstTableData, 'compile', formatTimed)
+        self.patch(PropertyTableData, 'compile', renderTimed)
+        self.patch(TableManager, 'getString', stringCounted(lambda strings: strings.data))
+        self.patch(TableManager, 'getString2', stringCounted(lambda strings: strings.data))
+        self.patch(TableManager, 'getStringByIndex', stringCounted(lambda strings: strings.byIndex))
+        self.patch(TableManager, 'compiled', compiledCounted)
+        self.patch(TableParser, 'describeUniqueItem', describeTimed('uniqueitems', lambda item: item.index))
+        self.patch(TableParser, 'describeRuneWord', describeTimed('runes', lambda rw: rw.name))
+        self.generation += 1
+
+    def disable(self):
+        if not self.enabled:
+            return
+
+        for cls, name, original in reversed(self.patches):
+            setattr(cls, name, original)
+
+        self.patches.clear()
+        self.generation += 1
+
+    def asDict(self) -> dict:
+        clean = cleanString.cache_info()
 
-    def formatArmor(self, uniqueItem: UniqueItemsTableData, baseItem: ArmorTableData) -> list[str]:
-        name = self.tblmgr.getString(uniqueItem.index)
-        armorTypename = self.tblmgr.getString(baseItem.code)
+        return {
+            'tables'        : {name: {'seconds': seconds, 'rows': rows} for name, (seconds, rows) in self.tables.items()},
+            'descfuncs'     : {str(k): {'calls': calls, 'seconds': seconds} for k, (calls, seconds) in self.descfuncs.items()},
+            'funcs'         : {k: {'calls': calls, 'seconds': seconds} for k, (calls, seconds) in self.funcs.items()},
+            'caches'        : {
+                'strings'       : {'hits': self.strings[0], 'misses': self.strings[1]},
+                'cleanString'   : {'hits': clean.hits - self.cleanBase.hits, 'misses': clean.misses - self.cleanBase.misses},
+                'compiled'      : {'hits': self.compiled[0], 'misses': self.compiled[1]},
+            },
+            'slowest'       : [{'seconds': seconds, 'table': table, 'name': name} for seconds, table, name in sorted(self.items, reverse = True)],
+        }
 
-        md = MarkdownHelper()
+    def report(self, workers: bool = False) -> str:
+        # with `workers` (-j) descfunc / func calls, compiled functions and items are rendered in the pool
+        # processes, whose counters never reach this one
+        data = self.asDict()
+        lines = ['table loads:']
+        lines += [f'  {name:<24} {t["seconds"] * 1e3:>9.2f}ms {t["rows"]:>7} rows' for name, t in data['tables'].items()]
+
+        for title, key in [('descfunc', 'descfuncs'), ('func', 'funcs')]:
+            lines.append(f'{title} calls:')
+            if workers:
+                lines.append('  unavailable with -j, rendering runs in the worker processes')
+                continue
 
-        md.line(f'### {md.uniqueColor(name)}')
-        md.line(f'### {md.uniqueColor(armorTypename)} [`i{baseItem.index}`] [`{baseItem.code}`]')
+            for name, t in sorted(data[key].items(), key = lambda kv: -kv[1]['seconds']):
+                lines.append(f'  {name:<24} {t["calls"]:>7} calls {t["seconds"] * 1e3:>9.2f}ms {t["seconds"] / t["calls"] * 1e6:>8.1f}us/call')
 
-        md.blank()
+        # cleanString only runs while a StringIndex is built from the tbl files, not when it comes from the snapshot
+        lines.append('caches:' + (' (main process only with -j)' if workers else ''))
+        for name, t in data['caches'].items():
+            total = t['hits'] + t['misses']
+            lines.append(f'  {name:<24} {t["hits"]:>7} hits {t["misses"]:>7} misses ({t["hits"] / total if total else 0:.1%})')
 
-        if baseItem.durability is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1d")}{baseItem.durability}')
+        lines.append('slowest items:')
+        if workers:
+            lines.append('  unavailable with -j, rendering runs in the worker processes')
 
-        if baseItem.reqstr is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1e")}{baseItem.reqstr}')
+        lines += [f'  {t["seconds"] * 1e3:>9.3f}ms {t["table"]} {t["name"]}' for t in data['slowest']]
 
-        if baseItem.reqdex is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1f")}{baseItem.reqdex}')
+        return '\n'.join(lines)
 
-        if uniqueItem.lvlreq is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1p")}{uniqueItem.lvlreq}')
+instruments = Instruments()
 
-        md.blank()
+class OutputFile:
+    # streams lines into `<path>.tmp` and renames it over `path` on commit,
+    # an aborted run leaves the previous file untouched
 
-        log(f'********** {uniqueItem.index} {name} {armorTypename} *********')
+    def __init__(self, path: str, encoding: str = 'UTF-8-SIG'):
+        self.path       = path
+        self.tmpname    = f'{path}.tmp'
+        self.file       = open(self.tmpname, 'w', encoding = encoding, newline = '', buffering = 1 << 16)
+        self.empty      = True
 
-        props = []
-        for prop in uniqueItem.props:
-            props.append([prop, self.formatProperty(prop)])
-            log('\n'.join(['\n'.join(p[1]) for p in props if p[1]]))
-            log()
+    def write(self, lines: list[str]):
+        # same bytes as '\n'.join() over everything written
+        if not lines:
+            return
 
-        for p in sorted(props, reverse = True, key = lambda p: p[0].descpriority):
-            if p[1]:
-                # descpriority = p[0].descpriority
-                for p in p[1]:
-                    md.line(f'{p}')
+        if self.empty:
+            self.empty = False
+        else:
+            self.file.write('\n')
 
-        log('\n'.join(md.text()))
+        self.file.write('\n'.join(lines))
 
-        # if name.count('奥罗拉的守护'): raise
+    def commit(self):
+        self.file.close()
+        os.replace(self.tmpname, self.path)
 
-        return md.text()
+    def discard(self):
+        self.file.close()
+        os.remove(self.tmpname)
+
+class Emitter:
+    # one output format; gets every generated item in order, then either commit() or discard()
+
+    NAME = None     # type: str
+
+    def __init__(self, directory: str):
+        self.directory  = directory
+
+    def item(self, model: ItemModel):
+        raise NotImplementedError(f'{type(self).__name__}.item')
+
+    def baseItem(self, index: int, code: str, name: str):
+        pass
+
+    def commit(self):
+        pass
+
+    def discard(self):
+        pass
+
+    def __enter__(self) -> 'Emitter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
+
+class OutputSink(Emitter):
+    # emitters writing one text file per item category
+
+    FILENAMES = {
+        'weapon'    : '暗金武器.md',
+        'armor'     : '暗金护甲.md',
+        'misc'      : '暗金其他.md',
+        'runewords' : '符文之语.md',
+        'itemindex' : '物品ID.txt',
+    }
+    ENCODING = 'UTF-8-SIG'
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.files      = {}    # type: dict[str, OutputFile]
+
+    def open(self, type: str) -> OutputFile:
+        os.makedirs(self.directory, exist_ok = True)
+        return OutputFile(os.path.join(self.directory, self.FILENAMES[type]), self.ENCODING)
 
-    def formatMisc(self, uniqueItem: UniqueItemsTableData, baseItem: MiscTableData) -> list[str]:
-        # if uniqueItem.code.startswith('e*'):
-        #     return []
+    def write(self, type: str, lines: list[str]):
+        # files are only created once something is written to them
+        file = self.files.get(type)
+        if file is None:
+            file = self.files[type] = self.open(type)
 
-        name = self.tblmgr.getString(uniqueItem.index)
-        miscTypename = self.tblmgr.getString2(self.tblmgr.misc.get(baseItem.code).namestr)
-        if miscTypename is None:
+        file.write(lines)
+
+    def commit(self):
+        for file in self.files.values():
+            file.commit()
+
+    def discard(self):
+        for file in self.files.values():
+            file.discard()
+
+class MarkdownEmitter(OutputSink):
+    NAME = 'md'
+
+    @staticmethod
+    def format(model: ItemModel | None) -> list[str]:
+        if model is None:
             return []
 
         md = MarkdownHelper()
 
-        md.line(f'### {md.uniqueColor(name)}')
-        md.line(f'### {md.uniqueColor(miscTypename)} [`i{baseItem.index}`] [`{baseItem.code}`]')
+        md.line(f'### {md.uniqueColor(model.name)}')
 
-        md.blank()
+        if model.category == 'runewords':
+            t = f'{len(model.runes)}孔 {"/".join(model.itypeNames)}'
+            t2 = ' '.join(model.itypes)
+            md.line(f'#### {md.uniqueColor(t)}')
+            md.line(f'#### {md.uniqueColor(t2)}')
+            md.blank()
+            md.line(' + '.join(model.runes))
+
+        else:
+            md.line(f'### {md.uniqueColor(model.typename)} [`i{model.index}`] [`{model.code}`]')
+            md.blank()
 
-        if uniqueItem.lvlreq is not None:
-            md.line(f'{self.tblmgr.getString("ItemStats1p")}{uniqueItem.lvlreq}')
+            if model.desc is not None:
+                md.line(model.desc)
 
-        md.blank()
+            for key, label, value in model.requirements:
+                md.line(f'{label}{value}')
 
-        log(f'********** {uniqueItem.index} {name} {miscTypename} *********')
+        md.blank()
 
-        props = []
-        for prop in uniqueItem.props:
-            props.append([prop, self.formatProperty(prop)])
-            log('\n'.join(['\n'.join(p[1]) for p in props if p[1]]))
-            log()
+        for lines, descpriority in model.properties:
+            for line in lines:
+                md.line(line)
 
-        for p in sorted(props, reverse = True, key = lambda p: p[0].descpriority):
-            if p[1]:
-                # descpriority = p[0].descpriority
-                for p in p[1]:
-                    md.line(f'{p}')
+        for slot, runes in model.runeProperties:
+            md.line(f'{slot}:')
 
-        log('\n'.join(md.text()))
+            for runeCode, props in runes:
+                md.list(f'{runeCode}: {props}')
 
-        # if name.count('奥罗拉的守护'): raise
+            md.blank()
 
         return md.text()
 
-    def formatRuneWord(self, rw: RuneWordsTableData) -> list[str]:
-        name = self.tblmgr.getString(rw.name)
-        itypes = '/'.join([s for s in [self.tblmgr.getBuiltinItemType(it) for it in rw.itypes] if s])
-        itypes2 = ' '.join(rw.itypes)
+    def item(self, model: ItemModel):
+        self.write(model.category, self.format(model))
+        self.write(model.category, ['', '----------------------', ''])
+
+    def baseItem(self, index: int, code: str, name: str):
+        self.write('itemindex', [f'{index:>4} {name}'])
+
+class JsonLinesEmitter(OutputSink):
+    NAME = 'jsonl'
+
+    FILENAMES = {
+        'weapon'    : '暗金武器.jsonl',
+        'armor'     : '暗金护甲.jsonl',
+        'misc'      : '暗金其他.jsonl',
+        'runewords' : '符文之语.jsonl',
+        'itemindex' : '物品ID.jsonl',
+    }
+    ENCODING = 'UTF8'
+
+    def item(self, model: ItemModel):
+        self.write(model.category, [json.dumps(model.asDict(), ensure_ascii = False)])
+
+    def baseItem(self, index: int, code: str, name: str):
+        self.write('itemindex', [json.dumps({'index': index, 'code': code, 'name': name}, ensure_ascii = False)])
+
+class HtmlEmitter(OutputSink):
+    NAME = 'html'
+
+    FILENAMES = {
+        'weapon'    : '暗金武器.html',
+        'armor'     : '暗金护甲.html',
+        'misc'      : '暗金其他.html',
+        'runewords' : '符文之语.html',
+        'itemindex' : '物品ID.html',
+    }
+    TITLES = {
+        'weapon'    : '暗金武器',
+        'armor'     : '暗金护甲',
+        'misc'      : '暗金其他',
+        'runewords' : '符文之语',
+        'itemindex' : '物品ID',
+    }
+    ENCODING = 'UTF8'
+
+    def open(self, type: str) -> OutputFile:
+        file = super().open(type)
+        file.write([
+            '<!DOCTYPE html>',
+            '<html>',
+            f'<head><meta charset="utf-8"><title>{self.TITLES[type]}</title>',
+            '<style>body { background: #000; color: #ddd; font-family: sans-serif } .unique { color: #9f8f5f } .item { margin-bottom: 2em }</style>',
+            '</head>',
+            '<body>',
+            f'<h1>{self.TITLES[type]}</h1>',
+        ])
+        return file
+
+    def item(self, model: ItemModel):
+        esc = html.escape
+        lines = ['<div class="item">', f'<h3 class="unique">{esc(model.name)}</h3>']
+
+        if model.category == 'runewords':
+            lines.append(f'<h4 class="unique">{len(model.runes)}孔 {esc("/".join(model.itypeNames))}</h4>')
+            lines.append(f'<h4 class="unique">{esc(" ".join(model.itypes))}</h4>')
+            lines.append(f'<p>{esc(" + ".join(model.runes))}</p>')
+
+        else:
+            lines.append(f'<h3 class="unique">{esc(model.typename)} [<code>i{model.index}</code>] [<code>{esc(model.code)}</code>]</h3>')
+
+            if model.desc is not None:
+                lines.append(f'<p>{esc(model.desc)}</p>')
+
+            for key, label, value in model.requirements:
+                lines.append(f'<p>{esc(label)}{value}</p>')
+
+        for props, descpriority in model.properties:
+            for line in props:
+                lines.append(f'<p>{esc(line)}</p>')
+
+        for slot, runes in model.runeProperties:
+            lines.append(f'<p>{esc(slot)}:</p>')
+            lines.append('<ul>')
+            lines.extend(f'<li>{esc(runeCode)}: {esc(props)}</li>' for runeCode, props in runes)
+            lines.append('</ul>')
+
+        lines.append('</div>')
+        self.write(model.category, lines)
+
+    def baseItem(self, index: int, code: str, name: str):
+        self.write('itemindex', [f'<p><code>{index:>4}</code> <code>{html.escape(code)}</code> {html.escape(name)}</p>'])
+
+    def commit(self):
+        for file in self.files.values():
+            file.write(['</body>', '</html>'])
+
+        super().commit()
+
+class SqliteEmitter(Emitter):
+    # one indexed database for the web front end, replaced atomically like the text outputs
+
+    NAME = 'sqlite'
+
+    FILENAME = 'darkmoon.db'
+    SCHEMA = """
+        create table items (
+            id          integer primary key,
+            category    text not null,
+            name        text not null,
+            typename    text,
+            code        text,
+            baseindex   integer,
+            description text,
+            durability  integer,
+            reqstr      integer,
+            reqdex      integer,
+            lvlreq      integer,
+            sockets     integer,
+            itypes      text,
+            runes       text
+        );
+        create table requirements (
+            item        integer not null references items(id),
+            ordinal     integer not null,
+            key         text not null,
+            label       text not null,
+            value       integer not null
+        );
+        create table properties (
+            item        integer not null references items(id),
+            ordinal     integer not null,
+            descpriority integer,
+            text        text not null
+        );
+        create table runeproperties (
+            item        integer not null references items(id),
+            slot        text not null,
+            rune        text not null,
+            text        text not null
+        );
+        create table baseitems (
+            baseindex   integer primary key,
+            code        text not null,
+            name        text not null
+        );
+        create index items_category on items(category);
+        create index items_name on items(name);
+        create index items_code on items(code);
+        create index requirements_item on requirements(item);
+        create index properties_item on properties(item);
+        create index properties_text on properties(text);
+        create index runeproperties_item on runeproperties(item);
+        create index baseitems_code on baseitems(code);
+    """
+
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.path       = os.path.join(directory, self.FILENAME)
+        self.tmpname    = f'{self.path}.tmp'
+        self.db         = None      # type: sqlite3.Connection | None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.db is None:
+            os.makedirs(self.directory, exist_ok = True)
+            if os.path.exists(self.tmpname):
+                os.remove(self.tmpname)
+
+            self.db = sqlite3.connect(self.tmpname)
+            self.db.executescript(self.SCHEMA)
+
+        return self.db
+
+    def item(self, model: ItemModel):
+        db = self.connect()
+        requirements = {key: value for key, label, value in model.requirements}
+
+        id = db.execute(
+            'insert into items (category, name, typename, code, baseindex, description, durability, reqstr, reqdex, lvlreq, sockets, itypes, runes) '
+            'values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (
+                model.category, model.name, model.typename, model.code, model.index, model.desc,
+                requirements.get('durability'), requirements.get('reqstr'), requirements.get('reqdex'), requirements.get('lvlreq'),
+                len(model.runes) if model.runes else None, ' '.join(model.itypes) or None, ' '.join(model.runes) or None,
+            ),
+        ).lastrowid
+
+        db.executemany(
+            'insert into requirements values (?, ?, ?, ?, ?)',
+            [(id, i, key, label, value) for i, (key, label, value) in enumerate(model.requirements)],
+        )
+        db.executemany(
+            'insert into properties values (?, ?, ?, ?)',
+            [(id, i, descpriority, line) for i, (line, descpriority) in enumerate((line, descpriority) for lines, descpriority in model.properties for line in lines)],
+        )
+        db.executemany(
+            'insert into runeproperties values (?, ?, ?, ?)',
+            [(id, slot, runeCode, props) for slot, runes in model.runeProperties for runeCode, props in runes],
+        )
+
+    def baseItem(self, index: int, code: str, name: str):
+        self.connect().execute('insert or replace into baseitems values (?, ?, ?)', (index, code, name))
+
+    def commit(self):
+        if self.db is None:
+            return
+
+        self.db.commit()
+        self.db.close()
+        os.replace(self.tmpname, self.path)
+
+    def discard(self):
+        if self.db is None:
+            return
+
+        self.db.close()
+        os.remove(self.tmpname)
+
+class SearchIndex:
+    # BM25 ranked inverted index over generated items. chinese text is split into character
+    # unigrams and bigrams, everything else into lowercase words; the weights are final after
+    # finish(), so a query only sums a few precomputed postings
+
+    TOKENS = re.compile(r'([\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+)|([0-9A-Za-z]+)')
+    BOOSTS = {'name': 3, 'typename': 2, 'text': 1}
+    K1 = 1.2
+    B = 0.75
 
-        md = MarkdownHelper()
+    def __init__(self):
+        self.docs       = []    # type: list[dict]
+        self.postings   = {}    # type: dict[str, list[tuple[int, float]]]
+        self.lengths    = []    # type: list[int]
+
+    @classmethod
+    def tokenize(cls, text: str, query: bool = False) -> list[str]:
+        tokens = []
+        for m in cls.TOKENS.finditer(text):
+            cjk, word = m.groups()
+            if word is not None:
+                tokens.append(word.lower())
+                continue
 
-        t = f'{len(rw.runes)}孔 {itypes}'
-        t2 = f'{itypes2}'
-        md.line(f'### {md.uniqueColor(name)}')
-        md.line(f'#### {md.uniqueColor(t)}')
-        md.line(f'#### {md.uniqueColor(t2)}')
+            # a query of two or more characters matches on bigrams only, documents carry both
+            if len(cjk) == 1 or not query:
+                tokens.extend(cjk)
+
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+
+        return tokens
+
+    def add(self, model: ItemModel):
+        fields = {
+            'name'      : [model.name],
+            'typename'  : [model.typename or ''],
+            'text'      : [
+                model.desc or '',
+                *[label for key, label, value in model.requirements],
+                *[line for lines, descpriority in model.properties for line in lines],
+                *model.itypeNames, *model.runes,
+                *[props for slot, runes in model.runeProperties for runeCode, props in runes],
+            ],
+        }
 
-        md.blank()
+        docid = len(self.docs)
+        self.docs.append({'category': model.category, 'name': model.name, 'typename': model.typename, 'code': model.code, 'index': model.index})
 
-        # md.line(f'{len(rw.runes)}孔 {itypes}')
-        md.line(f'{" + ".join(rw.runes)}')
+        freqs = {}
+        length = 0
+        for field, texts in fields.items():
+            boost = self.BOOSTS[field]
+            for text in texts:
+                for token in self.tokenize(text):
+                    freqs[token] = freqs.get(token, 0) + boost
+                    length += 1
 
-        md.blank()
+        self.lengths.append(length)
+        for token, tf in freqs.items():
+            self.postings.setdefault(token, []).append((docid, tf))
 
-        log(f'********** {name} {itypes} *********')
+    def finish(self):
+        count = len(self.docs)
+        avglen = sum(self.lengths) / count if count else 1
 
-        props = []
-        for prop in rw.props:
-            props.append([prop, self.formatProperty(prop)])
-            log('\n'.join(['\n'.join(p[1]) for p in props if p[1]]))
-            log()
+        for token, postings in self.postings.items():
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            self.postings[token] = [
+                (docid, idf * tf * (self.K1 + 1) / (tf + self.K1 * (1 - self.B + self.B * self.lengths[docid] / avglen)))
+                for docid, tf in postings
+            ]
 
-        for p in sorted(props, reverse = True, key = lambda p: p[0].descpriority):
-            if p[1]:
-                # descpriority = p[0].descpriority
-                for p in p[1]:
-                    md.line(f'{p}')
+    def save(self, filename: str):
+        tmpname = f'{filename}.tmp'
 
-        props = []
-        def formatRunesProperty(rw: RuneWordsTableData, type: str, getprops):
-            md.line(f'{type}:')
+        with open(tmpname, 'wb') as f:
+            pickle.dump((SEARCH_VERSION, self.docs, self.postings), f, pickle.HIGHEST_PROTOCOL)
 
-            for runeCode in rw.runes:
-                rune = self.tblmgr.gems.get(runeCode)
-                props = self.formatProperties(getprops(rune))
-                # for prop in getprops(rune):
-                #     props.extend(self.formatProperty(prop))
+        os.replace(tmpname, filename)
 
-                md.list(f'{runeCode}: {props}')
+    @classmethod
+    def load(cls, filename: str) -> 'SearchIndex':
+        with open(filename, 'rb') as f:
+            version, docs, postings = pickle.load(f)
 
-            md.blank()
+        if version != SEARCH_VERSION:
+            raise NotImplementedError(f'{filename}: search index version {version}, expected {SEARCH_VERSION}')
 
-        if 'rwt1' in rw.itypes:
-            formatRunesProperty(rw, '武器', lambda r: r.weaponProps)
+        index = cls()
+        index.docs = docs
+        index.postings = postings
+        return index
 
-        if 'rwt2' in rw.itypes:
-            formatRunesProperty(rw, '装甲', lambda r: r.helmProps)
+    def search(self, query: str, limit: int = 20) -> list[tuple[float, dict]]:
+        scores = {}
+        for token in dict.fromkeys(self.tokenize(query, query = True)):
+            for docid, weight in self.postings.get(token, ()):
+                scores[docid] = scores.get(docid, 0) + weight
 
-        if 'rwt3' in rw.itypes:
-            formatRunesProperty(rw, '盾牌', lambda r: r.shieldProps)
+        best = heapq.nlargest(limit, scores.items(), key = lambda hit: hit[1])
+        return [(score, self.docs[docid]) for docid, score in best]
 
-        log('\n'.join(['\n'.join(p[1]) for p in props if p[1]]))
-        log()
+class SearchEmitter(Emitter):
+    NAME = 'search'
 
-        log('\n'.join(md.text()))
+    def __init__(self, directory: str):
+        super().__init__(directory)
+        self.index      = SearchIndex()
 
-        # if name.count('财富'): ibp()
+    def item(self, model: ItemModel):
+        self.index.add(model)
 
-        return md.text()
+    def commit(self):
+        self.index.finish()
+        os.makedirs(self.directory, exist_ok = True)
+        self.index.save(os.path.join(self.directory, SEARCH_FILE))
+
+EMITTERS = {cls.NAME: cls for cls in [MarkdownEmitter, JsonLinesEmitter, SqliteEmitter, HtmlEmitter, SearchEmitter]}
+
+class TableDatabase:
+    # every loaded table plus the rendered unique item / rune word properties in one indexed sqlite file.
+    # each table gets a `_row` key (its position); list columns and records go to `<table>_<attr>` child tables
+
+    INDEXED = {'code', 'type', 'lvlreq', 'levelreq', 'stat', 'id', 'skill', 'charclass', 'prop', 'param', 'value', 'text'}
+
+    def __init__(self, filename: str):
+        self.filename   = filename
+        self.db         = sqlite3.connect(filename)
+        self.db.row_factory = sqlite3.Row
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self) -> 'TableDatabase':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    @staticmethod
+    def tableRows(tbl) -> list:
+        rows = getattr(tbl, 'items', None)
+        if rows is None:
+            rows = tbl.data.values() if isinstance(tbl.data, dict) else tbl.data
+
+        return list(rows)
+
+    @classmethod
+    def export(cls, filename: str, parser: 'TableParser') -> 'TableDatabase':
+        tmpname = f'{filename}.tmp'
+        if os.path.exists(tmpname):
+            os.remove(tmpname)
+
+        db = sqlite3.connect(tmpname)
+
+        try:
+            for name, (tblcls, tblfile) in TableManager.TABLES.items():
+                tbl = getattr(parser.tblmgr, name)
+                rows = cls.tableRows(tbl)
+                if rows:
+                    cls.exportTable(db, name, type(rows[0]).SCHEMA, rows)
+
+            cls.exportStrings(db, parser.tblmgr.strings)
+            cls.exportRendered(db, parser)
+
+            db.commit()
+
+        finally:
+            db.close()
+
+        os.replace(tmpname, filename)
+        return cls(filename)
+
+    @classmethod
+    def createTable(cls, db: sqlite3.Connection, table: str, columns: list[tuple[str, str]]):
+        q = cls.quote
+        db.execute(f'create table {q(table)} ({", ".join(f"{q(name)} {decl}" for name, decl in columns)})')
+
+        for name, decl in columns:
+            if name in cls.INDEXED or (name == '_row' and decl != 'integer primary key'):
+                db.execute(f'create index {q(f"{table}_{name}")} on {q(table)} ({q(name)})')
+
+    @classmethod
+    def exportTable(cls, db: sqlite3.Connection, table: str, schema: Schema, rows: list):
+        q = cls.quote
+        columns = [('_row', 'integer primary key')]
+        if schema.indexed:
+            columns.append(('index', 'integer'))
+
+        for column in schema.columns:
+            if type(column) is Column:
+                columns.append((column.attr, 'integer' if column.type is int else ''))
+
+        attrs = [name for name, decl in columns[1:]]
+
+        cls.createTable(db, table, columns)
+        db.executemany(
+            f'insert into {q(table)} values ({", ".join("?" * len(columns))})',
+            [(i, *[getattr(row, attr) for attr in attrs]) for i, row in enumerate(rows)],
+        )
+
+        for column in schema.columns:
+            child = f'{table}_{column.attr}'
+
+            if isinstance(column, Records):
+                record = getattr(column.factory, '__self__', column.factory)
+                fields = [name for name in slotNames(record) if name != 'index']
+
+                cls.createTable(db, child, [('_row', 'integer'), ('ordinal', 'integer'), *[(name, '') for name in fields]])
+                db.executemany(
+                    f'insert into {q(child)} values ({", ".join("?" * (len(fields) + 2))})',
+                    [(i, n, *[getattr(r, name) for name in fields]) for i, row in enumerate(rows) for n, r in enumerate(getattr(row, column.attr))],
+                )
+
+            elif isinstance(column, Columns):
+                cls.createTable(db, child, [('_row', 'integer'), ('ordinal', 'integer'), ('value', 'text')])
+                db.executemany(
+                    f'insert into {q(child)} values (?, ?, ?)',
+                    [(i, n, v) for i, row in enumerate(rows) for n, v in enumerate(getattr(row, column.attr))],
+                )
+
+    @classmethod
+    def exportStrings(cls, db: sqlite3.Connection, strings: 'StringIndex'):
+        # merged and stripped, the way rendering sees them
+        db.execute('create table strings (key text primary key, text text)')
+        db.executemany('insert into strings values (?, ?)', strings.data.items())
+
+    @classmethod
+    def exportRendered(cls, db: sqlite3.Connection, parser: 'TableParser'):
+        cls.createTable(db, 'rendered', [
+            ('tbl', 'text'), ('_row', 'integer'), ('ordinal', 'integer'),
+            ('prop', 'text'), ('param', ''), ('min', 'integer'), ('max', 'integer'),
+            ('descpriority', 'integer'), ('line', 'integer'), ('text', 'text'),
+        ])
+        db.execute('create index rendered_row on rendered (tbl, _row)')
+
+        for table in ['uniqueitems', 'runes']:
+            values = []
+            for i, item in enumerate(getattr(parser.tblmgr, table).items):
+                for n, prop in enumerate(item.props):
+                    rendered = parser.renderProperty(prop)
+                    for l, line in enumerate(rendered.lines):
+                        values.append((table, i, n, prop.prop, prop.param, prop.min, prop.max, rendered.descpriority, l, line))
+
+            db.executemany('insert into rendered values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', values)
+
+    def query(self, sql: str, *params) -> list[sqlite3.Row]:
+        return self.db.execute(sql, params).fetchall()
+
+    def findItems(
+        self,
+        table       : str,
+        *,
+        text        : str | None = None,
+        prop        : str | None = None,
+        param       : str | int | None = None,
+        maxLvlreq   : int | None = None,
+        code        : str | None = None,
+        itype       : str | None = None,
+    ) -> list[sqlite3.Row]:
+        # rows of uniqueitems or runes with their localized name; `text` matches a rendered property line,
+        # `prop`/`param` the raw property, `itype` a rune word item type
+        name = 'u."index"' if table == 'uniqueitems' else 'u.name'
+        where = []
+        params = []
+
+        if text is not None or prop is not None or param is not None:
+            cond = ['r.tbl = ?', 'r._row = u._row']
+            params.append(table)
+
+            for column, value in [('text', text), ('prop', prop), ('param', param)]:
+                if value is None:
+                    continue
+
+                if column == 'text':
+                    cond.append('r.text like ?')
+                    value = f'%{value}%'
+                else:
+                    cond.append(f'r.{column} = ?')
+
+                params.append(value)
+
+            where.append(f'exists (select 1 from rendered r where {" and ".join(cond)})')
+
+        if maxLvlreq is not None:
+            where.append('u.lvlreq <= ?')
+            params.append(maxLvlreq)
+
+        if code is not None:
+            where.append('u.code = ?')
+            params.append(code)
+
+        if itype is not None:
+            where.append('exists (select 1 from runes_itypes t where t._row = u._row and t.value = ?)')
+            params.append(itype)
+
+        sql = f'select u.*, s.text as localname from {self.quote(table)} u left join strings s on s.key = {name}'
+        if where:
+            sql += ' where ' + ' and '.join(where)
+
+        return self.query(f'{sql} order by u._row', *params)
+
+    def uniques(self, **filters) -> list[sqlite3.Row]:
+        return self.findItems('uniqueitems', **filters)
+
+    def runeWords(self, **filters) -> list[sqlite3.Row]:
+        return self.findItems('runes', **filters)
+
+    def properties(self, table: str, row: int) -> list[str]:
+        # rendered lines of one item in display order
+        return [r['text'] for r in self.query(
+            'select text from rendered where tbl = ? and _row = ? order by descpriority desc, ordinal, line', table, row,
+        )]
+
+# everything rendering reads, loaded (and snapshotted) before workers start
+RENDER_TABLES = [
+    'uniqueitems', 'runes', 'weapons', 'armor', 'misc', 'gems',
+    'properties', 'itemstatcost', 'charstats', 'skills', 'skilldesc', 'strings', 'baseitems',
+]
+
+workerParser = None     # type: TableParser | None
+
+def initRenderWorker(snapshot: str | None):
+    global workerParser
+
+    # forked workers inherit the parent's parser, spawned ones load it from the snapshot
+    if workerParser is None:
+        workerParser = TableParser(snapshot)
+
+def renderUniqueItems(parser: TableParser, indexes: list[int], track: bool) -> list[tuple[ItemModel | None, set | None]]:
+    items = parser.tblmgr.uniqueitems.items
+    results = []
+
+    for i in indexes:
+        with parser.tblmgr.recording(track) as deps:
+            model = parser.describeUniqueItem(items[i])
+
+        results.append((model, deps))
+
+    return results
+
+def renderRuneWords(parser: TableParser, indexes: list[int], track: bool) -> list[tuple[ItemModel | None, set | None]]:
+    items = parser.tblmgr.runes.items
+    results = []
+
+    for i in indexes:
+        with parser.tblmgr.recording(track) as deps:
+            model = parser.describeRuneWord(items[i])
+
+        results.append((model, deps))
+
+    return results
+
+def renderChunk(render, indexes: list[int], track: bool) -> list:
+    return render(workerParser, indexes, track)
+
+def createRenderPool(parser: TableParser, jobs: int) -> ProcessPoolExecutor | None:
+    global workerParser
+
+    if jobs <= 1:
+        return None
+
+    parser.tblmgr.preload(RENDER_TABLES)
+    parser.tblmgr.saveSnapshot()
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        workerParser = parser
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context('spawn')
+
+    return ProcessPoolExecutor(jobs, context, initializer = initRenderWorker, initargs = (parser.tblmgr.snapshot.filename,))
+
+def renderAll(parser: TableParser, render, indexes: list[int], pool: ProcessPoolExecutor | None, chunkSize: int, track: bool = False):
+    # yields render() results one item at a time, in the order of `indexes`
+    if pool is None:
+        yield from render(parser, indexes, track)
+        return
+
+    chunks = [indexes[i:i + chunkSize] for i in range(0, len(indexes), chunkSize)]
+
+    for results in pool.map(renderChunk, [render] * len(chunks), chunks, [track] * len(chunks)):
+        yield from results
+
+def rowValues(value):
+    if isinstance(value, TableData):
+        return (type(value).__name__, *[rowValues(getattr(value, name, None)) for name in slotNames(type(value))])
+
+    if isinstance(value, (list, tuple)):
+        return tuple(rowValues(v) for v in value)
+
+    return value
+
+@functools.cache
+def slotNames(cls: type) -> tuple[str, ...]:
+    names = []
+    for c in reversed(cls.__mro__):
+        names.extend(c.__dict__.get('__slots__', ()))
+
+    return tuple(names)
+
+def fingerprint(value) -> bytes:
+    return hashlib.blake2b(repr(rowValues(value)).encode('UTF8'), digest_size = 16).digest()
+
+class BuildCache:
+    # every item rendered by the last run: its own row fingerprint, its ItemModel
+    # and the fingerprints of all table rows it read; an item is reused while all of them still match.
+    # invalidated as a whole when tblparser.py itself changes
+
+    def __init__(self, filename: str | None):
+        self.filename       = filename
+        self.code           = codeDigest()
+        self.entries        = {}    # type: dict[tuple, tuple[bytes, ItemModel | None, dict[tuple, bytes]]]
+        self.fresh          = {}    # type: dict[tuple, tuple[bytes, ItemModel | None, dict[tuple, bytes]]]
+        self.fingerprints   = {}    # type: dict[tuple[str, object], bytes]
+        self.reused         = 0
+        self.rendered       = 0
+
+        if filename is not None:
+            self.load()
+
+    def load(self):
+        try:
+            with open(self.filename, 'rb') as f:
+                version, code, entries = pickle.load(f)
+
+        except FileNotFoundError:
+            return
+
+        except Exception as e:
+            logger.warning('ignore broken build cache %s: %r', self.filename, e)
+            return
+
+        if version == BUILD_VERSION and code == self.code:
+            self.entries = entries
+
+    def save(self):
+        if self.filename is None:
+            return
+
+        tmpname = f'{self.filename}.tmp'
+
+        with open(tmpname, 'wb') as f:
+            pickle.dump((BUILD_VERSION, self.code, self.fresh), f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmpname, self.filename)
+
+    def current(self, dep: tuple[str, object], tblmgr: 'TableManager') -> bytes:
+        value = self.fingerprints.get(dep)
+        if value is None:
+            value = self.fingerprints[dep] = fingerprint(tblmgr.lookup(*dep))
+
+        return value
+
+    def lookup(self, key: tuple, row: bytes, tblmgr: 'TableManager') -> tuple[ItemModel | None] | None:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != row:
+            return None
+
+        for dep, value in entry[2].items():
+            if self.current(dep, tblmgr) != value:
+                return None
+
+        self.fresh[key] = entry
+        self.reused += 1
+        return entry[1],
+
+    def store(self, key: tuple, row: bytes, model: ItemModel | None, deps: set, tblmgr: 'TableManager'):
+        self.fresh[key] = (row, model, {dep: self.current(dep, tblmgr) for dep in deps})
+        self.rendered += 1
+
+    def __str__(self) -> str:
+        return f'{self.reused} reused, {self.rendered} rendered'
+
+def itemKeys(table: str, items: list) -> list[tuple]:
+    # stable identity of each row across runs: its name plus which occurrence of that name it is
+    seen = {}
+    keys = []
+
+    for item in items:
+        name = item.name if table == 'runes' else item.index
+        n = seen[name] = seen.get(name, -1) + 1
+        keys.append((table, name, n))
+
+    return keys
+
+def generate(parser: TableParser, table: str, render, pool: ProcessPoolExecutor | None, chunkSize: int, build: BuildCache | None = None):
+    # yields the ItemModel (or None) of every row of `table` in order,
+    # with a build cache only the rows whose inputs changed are rendered again
+    items = getattr(parser.tblmgr, table).items
+
+    if build is None:
+        for model, deps in renderAll(parser, render, list(range(len(items))), pool, chunkSize):
+            yield model
+
+        return
+
+    keys = itemKeys(table, items)
+    rows = [fingerprint(item) for item in items]
+    cached = {}
+    dirty = []
+
+    for i, key in enumerate(keys):
+        hit = build.lookup(key, rows[i], parser.tblmgr)
+        if hit is None:
+            dirty.append(i)
+        else:
+            cached[i] = hit
+
+    rendered = renderAll(parser, render, dirty, pool, chunkSize, track = True)
+
+    for i in range(len(items)):
+        hit = cached.get(i)
+        if hit is not None:
+            yield hit[0]
+            continue
+
+        model, deps = next(rendered)
+        build.store(keys[i], rows[i], model, deps, parser.tblmgr)
+        yield model
+
+def parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description = 'generate unique item / rune word docs from the .txt tables')
+    ap.add_argument('-j', '--jobs', type = int, default = 1, help = 'render with this many worker processes')
+    ap.add_argument('--chunk-size', type = int, default = 0, help = 'items per worker task, 0 picks one')
+    ap.add_argument('-o', '--output', default = OUTPUT_DIR, help = 'directory the docs are written to')
+    ap.add_argument('-f', '--format', action = 'append', choices = list(EMITTERS), help = 'output format, may be repeated (default: md)')
+    ap.add_argument('--export-db', metavar = 'FILE', help = 'also export all tables and rendered properties to this sqlite file')
+    ap.add_argument('-v', '--verbose', action = 'count', default = 0, help = 'log progress, twice for debug output of every item')
+    ap.add_argument('--trace', action = 'append', default = [], metavar = 'ITEM', help = 'debug output for this unique item / rune word only (string key or name), may be repeated')
+    ap.add_argument('--profile', action = 'store_true', help = 'print load/render timings, string lookups and the slowest items')
+    ap.add_argument('-i', '--incremental', action = 'store_true', help = f'only re-render items whose inputs changed since the last run (kept in {BUILD_FILE})')
+
+    return ap.parse_args(argv)
+
+def run(argv: list[str] | None = None):
+    args = parseArgs(argv)
+
+    logging.basicConfig(format = '%(message)s', level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)])
+
+    if args.profile:
+        instruments.enable()
 
-def main():
-    uniqueItems = UniqueItemsTable('uniqueitems.txt')
-    runes = RuneWordsTable('runes.txt')
     parser = TableParser()
+    parser.trace.update(args.trace)
+    uniqueItems = parser.tblmgr.uniqueitems
+    runes = parser.tblmgr.runes
 
-    tbls = {}
+    build = BuildCache(BUILD_FILE) if args.incremental else None
+    pool = createRenderPool(parser, args.jobs)
+    chunkSize = args.chunk_size or max(1, len(uniqueItems.items) // (args.jobs * 4))
 
     try:
-        for uniqueItem in uniqueItems.items:
-            type = parser.getUniqueItemType(uniqueItem)
-            ret = parser.formatUniqueItem(uniqueItem)
-            if not ret:
-                continue
+        with contextlib.ExitStack() as stack:
+            emitters = [stack.enter_context(EMITTERS[name](args.output)) for name in dict.fromkeys(args.format or ['md'])]
 
-            lines = tbls.setdefault(type, [])  # type: list[str]
-            lines.extend(ret)
-            lines.append('')
-            lines.append('----------------------')
-            lines.append('')
+            for model in generate(parser, 'uniqueitems', renderUniqueItems, pool, chunkSize, build):
+                if model is None:
+                    continue
 
-        runewords = []
-        tbls['runewords'] = runewords
+                for emitter in emitters:
+                    emitter.item(model)
 
-        for rw in runes.items:
-            ret = parser.formatRuneWord(rw)
-            if not ret:
-                raise
+            for model in generate(parser, 'runes', renderRuneWords, pool, chunkSize, build):
+                if model is None:
+                    raise
 
-            runewords.extend(ret)
-            runewords.append('')
-            runewords.append('----------------------')
-            runewords.append('')
+                for emitter in emitters:
+                    emitter.item(model)
 
-        itemindeies = []
-        tbls['itemindex'] = itemindeies
+            for item in parser.tblmgr.baseitems.items:
+                if item.name is None:
+                    continue
 
-        tblmgr = parser.tblmgr
+                for emitter in emitters:
+                    emitter.baseItem(item.index, item.code, item.name)
 
-        for tbl in [
-            sorted(tblmgr.weapons.data.values(), key = lambda w: w.index),
-            sorted(tblmgr.armor.data.values(), key = lambda w: w.index),
-            sorted(tblmgr.misc.data.values(), key = lambda w: w.index),
-        ]:
-            for item in tbl:
-                name = tblmgr.getString2(item.code)
-                if name is None:
-                    continue
+        if build is not None:
+            build.save()
+            log('build cache: %s', build)
+
+        if args.export_db:
+            TableDatabase.export(args.export_db, parser).close()
 
-                itemindeies.append(f'{item.index:>4} {name}')
     finally:
-        filenames = {
-            'weapon'    : '暗金武器.md',
-            'armor'     : '暗金护甲.md',
-            'misc'      : '暗金其他.md',
-            'runewords' : '符文之语.md',
-            'itemindex' : '物品ID.txt',
-        }
+        if pool is not None:
+            pool.shutdown(cancel_futures = True)
 
-        for type, tbl in tbls.items():
-            if not tbl:
-                continue
+        parser.tblmgr.saveSnapshot()
+        log('touched tables: %s', parser.tblmgr.touchedTables())
+        log('property cache: %s', parser.propertyCache)
 
-            open(r'D:\Dev\Source\sources\Diablo II\DarkMoonData\\' + filenames[type], 'wb').write('\n'.join(tbl).encode('UTF-8-SIG'))
+        if args.profile:
+            instruments.disable()
+            print(instruments.report(workers = pool is not None))
+            print(f'property cache: {parser.propertyCache}')
 
+def main(argv: list[str] | None = None):
+    run(argv)
     console.pause('done')
 
 if __name__ == '__main__':
-    Try(main)
+    # run from the imported module so pickled snapshot entries refer to `tblparser.*`
+    # and stay loadable by other scripts importing it
+    import tblparser
+    Try(tblparser.main)
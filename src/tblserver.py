@@ -0,0 +1,301 @@
+from ml import *
+from tblparser import *
+import argparse
+import asyncio
+import json
+import logging
+import os
+import urllib.parse
+
+# a resident tblparser: keeps the parsed tables in memory and answers json queries over http,
+# tables whose files change are reloaded in a worker thread and swapped in when ready
+
+WATCH_INTERVAL = 1.0
+
+def rowDict(value):
+    if isinstance(value, Property):
+        return dict(zip(Property.__slots__, value.key()))
+
+    if isinstance(value, TableData):
+        return {name: rowDict(getattr(value, name, None)) for name in slotNames(type(value))}
+
+    if isinstance(value, (list, tuple)):
+        return [rowDict(v) for v in value]
+
+    return value
+
+class QueryError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class TableServer:
+    def __init__(self, snapshot: str | None = SNAPSHOT_FILE):
+        self.snapshot   = snapshot
+        self.parser     = TableParser(snapshot)
+        self.mtimes     = {}    # type: dict[str, int]
+        self.reloads    = 0
+        self.reloading  = False     # rebuild() runs in the executor, instruments must not be switched under it
+
+        # everything is loaded up front, a query must never wait for a lazy load
+        self.load(self.parser.tblmgr)
+        self.mtimes = self.scan()
+
+    @staticmethod
+    def load(tblmgr: TableManager):
+        tblmgr.preload([*TableManager.TABLES, *TableManager.INDEXES])
+        tblmgr.saveSnapshot()
+
+    def scan(self) -> dict[str, int]:
+        mtimes = {}
+        for name, (cls, filename) in TableManager.TABLES.items():
+            try:
+                mtimes[name] = os.stat(filename).st_mtime_ns
+            except FileNotFoundError:
+                mtimes[name] = None
+
+        return mtimes
+
+    def rebuild(self, changed: set[str]) -> TableParser:
+        # runs in a worker thread: unchanged tables are shared with the live parser,
+        # the changed ones and every index built from them are loaded again
+        old = self.parser.tblmgr
+        parser = TableParser(self.snapshot)
+        tblmgr = parser.tblmgr
+
+        stale = set(changed)
+        for name, (cls, sources) in TableManager.INDEXES.items():
+            if stale.intersection(sources):
+                stale.add(name)
+
+        for name in [*TableManager.TABLES, *TableManager.INDEXES]:
+            if name not in stale and name in old.__dict__:
+                setattr(tblmgr, name, old.__dict__[name])
+
+        self.load(tblmgr)
+        return parser
+
+    async def watch(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            await asyncio.sleep(WATCH_INTERVAL)
+
+            mtimes = await loop.run_in_executor(None, self.scan)
+            changed = {name for name, mtime in mtimes.items() if mtime != self.mtimes.get(name)}
+            if not changed:
+                continue
+
+            log('reload %s', sorted(changed))
+
+            self.reloading = True
+            try:
+                parser = await loop.run_in_executor(None, self.rebuild, changed)
+            except Exception as e:
+                # keep serving the old data, retry once the files change again
+                logger.warning('reload failed: %r', e)
+                self.mtimes = mtimes
+                continue
+            finally:
+                self.reloading = False
+
+            self.parser = parser
+            self.mtimes = mtimes
+            self.reloads += 1
+
+    def query(self, path: str, params: dict[str, str]):
+        # every handler works on the parser current at the time of the request
+        parser = self.parser
+        tblmgr = parser.tblmgr
+
+        def param(name: str) -> str:
+            value = params.get(name)
+            if value is None:
+                raise QueryError(400, f'missing parameter `{name}`')
+
+            return value
+
+        def intParam(name: str) -> int:
+            try:
+                return int(param(name))
+            except ValueError:
+                raise QueryError(400, f'`{name}` must be an integer')
+
+        def intOrEmpty(name: str) -> str:
+            # left as text for Property(), which parses it
+            value = params.get(name, '')
+            if value:
+                try:
+                    int(value)
+                except ValueError:
+                    raise QueryError(400, f'`{name}` must be an integer')
+
+            return value
+
+        def found(value, what: str):
+            if value is None:
+                raise QueryError(404, f'{what} not found')
+
+            return value
+
+        match path:
+            case '/status':
+                return {
+                    'tables'    : [name for name in [*TableManager.TABLES, *TableManager.INDEXES] if name in tblmgr.__dict__],
+                    'reloads'   : self.reloads,
+                    'cache'     : str(parser.propertyCache),
+                }
+
+            case '/profile':
+                # ?enable=1 starts collecting, ?enable=0 stops, the counters stay readable
+                if 'enable' in params:
+                    # enable() / disable() patch the classes rebuild() is loading with
+                    if self.reloading:
+                        raise QueryError(409, 'tables are being reloaded, switch profiling once that is done')
+
+                    if params['enable'] in ('', '0'):
+                        instruments.disable()
+                    else:
+                        instruments.enable()
+
+                return {'enabled': instruments.enabled, **instruments.asDict()}
+
+            case '/string':
+                return {'key': param('key'), 'value': found(tblmgr.getString2(param('key')), 'string')}
+
+            case '/item':
+                code = param('code')
+                item = found(tblmgr.getBaseItem(code), f'item `{code}`')
+                return {**rowDict(item.row), 'category': item.category, 'localname': item.name}
+
+            case '/unique':
+                items = tblmgr.uniqueitems.items
+                if 'row' in params:
+                    row = intParam('row')
+                    if not 0 <= row < len(items):
+                        raise QueryError(404, 'unique item not found')
+                else:
+                    name = param('name')
+                    row = found(next((i for i, item in enumerate(items) if name in (item.index, tblmgr.getString2(item.index))), None), 'unique item')
+
+                model = parser.describeUniqueItem(items[row])
+                return {'row': row, **(model.asDict() if model is not None else {})}
+
+            case '/runeword':
+                items = tblmgr.runes.items
+                if 'row' in params:
+                    row = intParam('row')
+                    if not 0 <= row < len(items):
+                        raise QueryError(404, 'rune word not found')
+                else:
+                    name = param('name')
+                    row = found(next((i for i, rw in enumerate(items) if name in (rw.name, tblmgr.getString2(rw.name))), None), 'rune word')
+
+                return {'row': row, **parser.describeRuneWord(items[row]).asDict()}
+
+            case '/skill':
+                key = param('id')
+                try:
+                    skill = tblmgr.getSkill(int(key) if key.isdigit() else key)
+                except KeyError:
+                    raise QueryError(404, f'skill `{key}` not found')
+
+                return {'name': tblmgr.getSkillName(skill.id), **rowDict(skill)}
+
+            case '/property':
+                code = param('prop')
+                if code not in tblmgr.properties.data:
+                    raise QueryError(404, f'property `{code}` not found')
+
+                # a number or a skill name, like the tables have it
+                value = params.get('param', '')
+                if value and not value.isdigit() and not (value.startswith('sk') and value in tblmgr.skills.dataByName):
+                    raise QueryError(400, '`param` must be a number or a skill name')
+
+                # a plain Property, interning only happens while a table loads
+                prop = Property(code, value, intOrEmpty('min'), intOrEmpty('max'))
+
+                try:
+                    rendered = parser.renderProperty(prop)
+                except Exception as e:
+                    # the formatters assume values the tables actually use, anything else is the query's fault
+                    logger.debug('render %s failed: %r', prop, e)
+                    raise QueryError(400, f'property `{code}` cannot be rendered with these values')
+
+                return {'lines': list(rendered.lines), 'descpriority': rendered.descpriority}
+
+            case '/grants':
+                if 'stat' in params:
+                    grants = tblmgr.grants.grantsStat(params['stat'])
+                else:
+                    value = params.get('param')
+                    grants = tblmgr.grants.grants(param('prop'), int(value) if value and value.isdigit() else value)
+
+                return [{**rowDict(grant), 'localname': tblmgr.getString2(grant.name)} for grant in grants]
+
+        raise QueryError(404, f'unknown query {path}')
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+
+            try:
+                # raw non-ascii in the target is taken as UTF-8, like the percent escapes parse_qsl decodes
+                method, target, version = request.decode('UTF8', errors = 'replace').split()
+            except ValueError:
+                raise QueryError(400, 'bad request')
+
+            if method != 'GET':
+                raise QueryError(405, f'method {method} not allowed')
+
+            url = urllib.parse.urlsplit(target)
+            status, body = 200, self.query(url.path, dict(urllib.parse.parse_qsl(url.query)))
+
+        except QueryError as e:
+            status, body = e.status, {'error': str(e)}
+
+        except Exception as e:
+            logger.exception('query failed: %r', e)
+            status, body = 500, {'error': repr(e)}
+
+        data = json.dumps(body, ensure_ascii = False).encode('UTF8')
+        writer.write(
+            f'HTTP/1.1 {status} {"OK" if status == 200 else "Error"}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(data)}\r\n'
+            f'Connection: close\r\n\r\n'.encode('latin-1') + data
+        )
+
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        watcher = asyncio.create_task(self.watch())
+
+        log('serving on %s:%d', host, port)
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+
+def parseArgs(argv: list[str] | None = None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description = 'answer json queries about the .txt tables over http')
+    ap.add_argument('--host', default = '127.0.0.1', help = 'address to listen on')
+    ap.add_argument('-p', '--port', type = int, default = 8014, help = 'port to listen on')
+
+    return ap.parse_args(argv)
+
+def main(argv: list[str] | None = None):
+    args = parseArgs(argv)
+    logging.basicConfig(format = '%(message)s', level = logging.INFO)
+    asyncio.run(TableServer().serve(args.host, args.port))
+
+if __name__ == '__main__':
+    Try(main)